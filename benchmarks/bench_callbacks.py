@@ -0,0 +1,330 @@
+#******************************************************************************
+#CALLBACK BENCHMARK
+#******************************************************************************
+
+#loads the dashboard from a folder of input files (e.g. the synthetic files written by make_synthetic_data.py) and times each callback over a fixed
+#set of input values. the latency percentiles, response sizes and peak memory are printed and saved as JSON, and can be compared against a
+#previous run:
+#   python benchmarks/make_synthetic_data.py --scale 10
+#   python benchmarks/bench_callbacks.py --data benchmarks/data/10x --output bench_10x.json
+#   python benchmarks/bench_callbacks.py --data benchmarks/data/10x --baseline bench_10x.json
+#--parity checks that the duckdb query backend (MEDICARE_QUERY_BACKEND=duckdb) returns the same results as pandas instead:
+#   python benchmarks/bench_callbacks.py --data benchmarks/data/10x --parity
+#--shared-parity checks that every cached callback returns the same results from the memory-mapped datasets (MEDICARE_SHARED_DATA=1) as from the loaded ones:
+#   python benchmarks/bench_callbacks.py --data benchmarks/data/10x --shared-parity
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+
+#input values of each benchmarked callback. the values exist in both the real files and the synthetic files, so runs on either can be compared
+hh_metrics = ["Quality of patient care star rating",
+              "How often patients got better at walking or moving around",
+              "How much Medicare spends on an episode of care at this agency, compared to Medicare spending across all agencies nationally"]
+
+hs_measures = ["Hospice and Palliative Care Pain Screening",
+               "Hospice Visits When Death Is Imminent, Measure 1",
+               "Percent of Patients with Dementia"]
+
+ho_measures = ["Heart Attack Measure", "Hip/Knee Replacement Measure"]
+
+bench_inputs = {"create_rank_table": [(st, msr, yrs, rank5_opt, avg_type) for st in ["All", "CA", "TX"] for msr in hs_measures
+                                      for yrs in [[2015, 2019], [2019, 2019]] for rank5_opt, avg_type in [("Top 5", "Mean"), ("Bottom 5", "Median")]],
+                "create_hospital_pies": [(st, msr, value_cat, pmt_cat) for st in ["All", "CA", "TX"] for msr in ho_measures
+                                         for value_cat, pmt_cat in [("Average Mortality and Average Payment", "No Different Than the National Average Payment"),
+                                                                    ("Not Available", "Not Available")]],
+                "render_hh_histplot": [(metric, "State", "CA", "TX") for metric in hh_metrics] +
+                                      [(metric, "Type of Ownership", "PROPRIETARY", "NON-PROFIT") for metric in hh_metrics],
+                "show_sum_boxes": [(metric, st) for metric in ["Total Number of Providers", "% of Providers Offering Nursing Care Services", "Quality of Patient Care"] for st in ["All", "CA", "TX"]],
+                "render_hh_choropleth": [(metric, st) for metric in ["Total Number of Providers", "% of Providers Offering Nursing Care Services", "Quality of Patient Care"] for st in ["All", "CA", "TX"]]}
+
+#------------------------------------------------------------------------------
+
+#function to import the dashboard reading its input files from data_dir. returns the module and the seconds taken to load it
+def load_dashboard(data_dir):
+
+    os.environ["MEDICARE_DATA_DIR"] = os.path.abspath(data_dir)
+    sys.path.insert(0, os.path.dirname(bench_dir))
+
+    start = time.perf_counter()
+    import medicare_dashboard
+
+    return medicare_dashboard, time.perf_counter() - start
+
+#function to return the callback to benchmark. cached callbacks are called without their cache unless use_cache is set
+def get_callback(dashboard, name, use_cache = False):
+
+    if name not in dashboard.callback_funcs:
+        return getattr(dashboard, name)
+
+    if not use_cache:
+        return dashboard.callback_funcs[name]
+
+    #unwrap the function registered with dash (if any) down to the cached function, which wraps the callback itself
+    func = getattr(dashboard, name)
+    while func.__wrapped__ is not dashboard.callback_funcs[name]:
+        func = func.__wrapped__
+
+    return func
+
+#function to return the latency percentiles (in milliseconds) of a list of timings (in seconds)
+def get_latency_stats(secs, prefix = ""):
+
+    msecs = np.array(secs)*1000
+
+    return {prefix + "p50_ms": round(float(np.percentile(msecs, 50)), 3),
+            prefix + "p90_ms": round(float(np.percentile(msecs, 90)), 3),
+            prefix + "p99_ms": round(float(np.percentile(msecs, 99)), 3),
+            prefix + "mean_ms": round(float(msecs.mean()), 3),
+            prefix + "max_ms": round(float(msecs.max()), 3)}
+
+#function to time one callback over its input values. each set of input values is called warmup times before it is timed repeat times, and the
+#returned JSON is timed separately. the peak memory allocated by a single call is measured in a separate pass, since tracing slows down the calls
+def bench_callback(dashboard, name, args_lst, repeat, warmup, use_cache = False):
+
+    func = get_callback(dashboard, name, use_cache)
+    encoder = dashboard.FastJSONEncoder if dashboard.fast_json_enabled else dashboard.PlotlyJSONEncoder
+    call_secs = []
+    encode_secs = []
+    response_bytes = []
+
+    for args in args_lst:
+        for i in range(warmup):
+            func(*args)
+        for i in range(repeat):
+            start = time.perf_counter()
+            result = func(*args)
+            mid = time.perf_counter()
+            result_json = json.dumps(result, cls = encoder)
+            call_secs.append(mid - start)
+            encode_secs.append(time.perf_counter() - mid)
+        response_bytes.append(len(result_json))
+
+    peak_bytes = 0
+    for args in args_lst:
+        tracemalloc.start()
+        func(*args)
+        peak_bytes = max(peak_bytes, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    stats = {"cases": len(args_lst), "calls": len(call_secs)}
+    stats.update(get_latency_stats(call_secs))
+    stats.update(get_latency_stats(encode_secs, "encode_"))
+    stats["response_kb"] = round(max(response_bytes)/1024, 1)
+    stats["peak_alloc_mb"] = round(peak_bytes/2**20, 2)
+
+    return stats
+
+#function to return the peak resident memory of this process in MB
+def get_peak_rss_mb():
+
+    #ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return round(peak_rss/(2**20 if sys.platform == "darwin" else 2**10), 1)
+
+#function to run the benchmark of the given callbacks (all by default) and return the results
+def run_benchmark(data_dir, names = None, repeat = 20, warmup = 2, use_cache = False):
+
+    dashboard, load_secs = load_dashboard(data_dir)
+
+    results = {"meta": {"data_dir": os.path.abspath(data_dir),
+                        "rows": {"hha": len(dashboard.hha_df), "hs": len(dashboard.hs_df), "ho": len(dashboard.ho_df)},
+                        "repeat": repeat,
+                        "warmup": warmup,
+                        "use_cache": use_cache,
+                        "fast_json": dashboard.fast_json_enabled,
+                        "query_backend": dashboard.query_backend,
+                        "python": platform.python_version(),
+                        "pandas": dashboard.pd.__version__,
+                        "machine": platform.machine(),
+                        "timestamp": datetime.now().isoformat(timespec = "seconds")},
+               "load_secs": round(load_secs, 3),
+               "callbacks": {}}
+
+    for name in (names or list(bench_inputs)):
+        results["callbacks"][name] = bench_callback(dashboard, name, bench_inputs[name], repeat, warmup, use_cache)
+        print_callback_stats(name, results["callbacks"][name])
+
+    results["peak_rss_mb"] = get_peak_rss_mb()
+
+    return results
+
+#------------------------------------------------------------------------------
+
+#aggregates built by each query backend, with the columns identifying their rows. the rows are compared in the order of these columns, since the backends
+#may order rows differently where the dashboard does not depend on it
+parity_frames = {"hs_stats_df": ["State", "Measure Name", "Start Year"],
+                 "ho_cube_df": ["Payment Measure", "State", "City", "Value of Care Category", "Payment Category"],
+                 "ho_view_df": None}
+
+#callbacks whose results depend on the query backend
+parity_callbacks = ["create_rank_table", "create_hospital_pies"]
+
+#function to return the mismatches between two versions of an aggregate. text and integer columns must be equal, while floating point columns may differ
+#by rounding (e.g. when sums are added up in a different order)
+def compare_frames(name, df, other_df, key_cols = None):
+
+    if list(df.columns) != list(other_df.columns) or len(df) != len(other_df):
+        return ["{0}: {1} rows and columns {2} against {3} rows and columns {4}".format(name, len(df), list(df.columns), len(other_df), list(other_df.columns))]
+
+    if key_cols is not None:
+        df = df.astype({col: str for col in key_cols}).sort_values(by = key_cols).reset_index(drop = True)
+        other_df = other_df.astype({col: str for col in key_cols}).sort_values(by = key_cols).reset_index(drop = True)
+
+    mismatches = []
+    for col in df.columns:
+        vals = df[col].to_numpy()
+        other_vals = other_df[col].to_numpy()
+        if vals.dtype.kind == "f" and other_vals.dtype.kind == "f":
+            same = np.allclose(vals, other_vals, rtol = 1e-9, atol = 0, equal_nan = True)
+        else:
+            same = (vals.astype(str) == other_vals.astype(str)).all()
+        if not same:
+            mismatches.append("{0}: column {1} differs".format(name, col))
+
+    return mismatches
+
+#function to check that the duckdb query backend returns the same results as pandas: the aggregates built by each backend from the loaded datasets,
+#and the JSON returned by each callback depending on the backend over its benchmark input values. returns the list of mismatches
+def check_backend_parity(dashboard):
+
+    backend_snapshots = {}
+    backend_results = {}
+    for backend in ["pandas", "duckdb"]:
+        dashboard.query_backend = backend
+        backend_snapshots[backend] = dashboard.build_data_snapshot(dashboard.hha_df, dashboard.hs_df, dashboard.ho_df)
+        vars(dashboard).update(backend_snapshots[backend])
+        backend_results[backend] = {name: [json.dumps(dashboard.callback_funcs[name](*args), cls = dashboard.PlotlyJSONEncoder) for args in bench_inputs[name]]
+                                    for name in parity_callbacks}
+
+    mismatches = []
+    for name, key_cols in parity_frames.items():
+        mismatches += compare_frames(name, backend_snapshots["pandas"][name], backend_snapshots["duckdb"][name], key_cols)
+    for name in parity_callbacks:
+        for args, result_json, other_json in zip(bench_inputs[name], backend_results["pandas"][name], backend_results["duckdb"][name]):
+            if result_json != other_json:
+                mismatches.append("{0}{1}: results differ".format(name, tuple(args)))
+        print("{0:<24}{1:>6} input values compared".format(name, len(bench_inputs[name])))
+
+    return mismatches
+
+#function to return up to max_inputs input values spread evenly over a list of input values
+def sample_inputs(args_lst, max_inputs):
+
+    step = max(1, -(-len(args_lst)//max_inputs))
+
+    return args_lst[::step]
+
+#function to check that the callbacks return the same results from the shared datasets (see publish_shared_frames) as from the datasets they were
+#built from. each cached callback is called over up to max_inputs of the input values it can receive from the dashboard (see get_precompute_inputs),
+#on top of its benchmark input values. returns the list of mismatches
+def check_shared_parity(dashboard, max_inputs = 500):
+
+    parity_inputs = {name: sample_inputs(args_lst, max_inputs) + bench_inputs.get(name, []) for name, args_lst in dashboard.get_precompute_inputs().items()}
+    parity_inputs["render_hh_choropleth"] = bench_inputs["render_hh_choropleth"]
+
+    shared_results = {}
+    for shared in [False, True]:
+        if shared:
+            filepaths = [dashboard.hha_filepath] + dashboard.hs_filepaths + [dashboard.ho_filepath]
+            vars(dashboard).update(dashboard.publish_shared_frames({name: getattr(dashboard, name) for name in dashboard.shared_frame_names}, filepaths))
+        shared_results[shared] = {name: [json.dumps(get_callback(dashboard, name)(*args), cls = dashboard.PlotlyJSONEncoder) for args in args_lst]
+                                  for name, args_lst in parity_inputs.items()}
+
+    mismatches = []
+    for name, args_lst in parity_inputs.items():
+        for args, result_json, other_json in zip(args_lst, shared_results[False][name], shared_results[True][name]):
+            if result_json != other_json:
+                mismatches.append("{0}{1}: results differ".format(name, tuple(args)))
+        print("{0:<24}{1:>6} input values compared".format(name, len(args_lst)))
+
+    return mismatches
+
+#------------------------------------------------------------------------------
+
+#function to print the results of one callback
+def print_callback_stats(name, stats):
+
+    print("{0:<24}{1:>10.2f}{2:>10.2f}{3:>10.2f}{4:>12.2f}{5:>12.1f}{6:>12.2f}".format(name, stats["p50_ms"], stats["p90_ms"], stats["p99_ms"],
+                                                                                        stats["encode_p50_ms"], stats["response_kb"], stats["peak_alloc_mb"]))
+
+#function to print each callback's change against a baseline run. returns the names of the callbacks whose median latency grew by more than max_slowdown
+def compare_to_baseline(results, baseline, max_slowdown = None):
+
+    print("\n{0:<24}{1:>14}{2:>14}{3:>10}{4:>14}{5:>14}".format("vs baseline", "p50 ms", "base p50 ms", "ratio", "peak MB", "base peak MB"))
+    slower = []
+    for name, stats in results["callbacks"].items():
+        base_stats = baseline["callbacks"].get(name)
+        if base_stats is None:
+            continue
+        ratio = stats["p50_ms"]/base_stats["p50_ms"] if base_stats["p50_ms"] > 0 else float("inf")
+        print("{0:<24}{1:>14.2f}{2:>14.2f}{3:>10.2f}{4:>14.2f}{5:>14.2f}".format(name, stats["p50_ms"], base_stats["p50_ms"], ratio,
+                                                                                  stats["peak_alloc_mb"], base_stats["peak_alloc_mb"]))
+        if max_slowdown is not None and ratio > max_slowdown:
+            slower.append(name)
+    print("{0:<24}{1:>14.1f}{2:>14.1f}".format("peak rss (MB)", results["peak_rss_mb"], baseline["peak_rss_mb"]))
+    print("{0:<24}{1:>14.2f}{2:>14.2f}".format("load (s)", results["load_secs"], baseline["load_secs"]))
+
+    return slower
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Benchmark the callbacks of the Medicare Utilization Dashboard")
+    parser.add_argument("--data", default = os.path.join(bench_dir, "data", "1x"),
+                        help = "folder holding the input files (benchmarks/data/1x by default)")
+    parser.add_argument("--callbacks", nargs = "+", choices = list(bench_inputs), help = "names of the callbacks to benchmark (all by default)")
+    parser.add_argument("--repeat", type = int, default = 20, help = "number of timed calls for each set of input values")
+    parser.add_argument("--warmup", type = int, default = 2, help = "number of untimed calls for each set of input values")
+    parser.add_argument("--cached", action = "store_true", help = "call the callbacks through their result cache, as the dashboard does")
+    parser.add_argument("--output", help = "JSON file to save the results to")
+    parser.add_argument("--baseline", help = "JSON file of a previous run to compare the results against")
+    parser.add_argument("--max-slowdown", type = float,
+                        help = "exit with an error if the median latency of a callback is more than this multiple of the baseline's")
+    parser.add_argument("--parity", action = "store_true",
+                        help = "check that the duckdb query backend returns the same results as pandas instead of timing the callbacks")
+    parser.add_argument("--shared-parity", action = "store_true",
+                        help = "check that the callbacks return the same results from the shared (memory-mapped) datasets instead of timing the callbacks")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.data):
+        sys.exit("{0} does not exist. Write synthetic input files with benchmarks/make_synthetic_data.py first".format(args.data))
+
+    if args.parity:
+        dashboard = load_dashboard(args.data)[0]
+        if dashboard.duckdb is None:
+            sys.exit("duckdb is not installed")
+        mismatches = check_backend_parity(dashboard)
+        for mismatch in mismatches:
+            print(mismatch)
+        sys.exit("{0} mismatches between the pandas and duckdb query backends".format(len(mismatches)) if mismatches else 0)
+
+    if args.shared_parity:
+        mismatches = check_shared_parity(load_dashboard(args.data)[0])
+        for mismatch in mismatches:
+            print(mismatch)
+        sys.exit("{0} mismatches between the loaded and the shared datasets".format(len(mismatches)) if mismatches else 0)
+
+    print("{0:<24}{1:>10}{2:>10}{3:>10}{4:>12}{5:>12}{6:>12}".format("callback", "p50 ms", "p90 ms", "p99 ms", "encode ms", "resp KB", "peak MB"))
+    results = run_benchmark(args.data, args.callbacks, args.repeat, args.warmup, args.cached)
+    print("\nloaded in {0:.2f}s, peak rss {1:.1f} MB".format(results["load_secs"], results["peak_rss_mb"]))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent = 2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = compare_to_baseline(results, json.load(f), args.max_slowdown)
+        if slower:
+            sys.exit("slower than the baseline: " + ", ".join(slower))
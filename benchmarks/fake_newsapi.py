@@ -0,0 +1,86 @@
+#******************************************************************************
+#LOCAL STAND-IN FOR THE NEWS API
+#******************************************************************************
+
+#serves canned responses for the news api endpoints used by the dashboard (sources, top-headlines and everything), so that load tests do not hit newsapi.org.
+#start it, then point the dashboard at it:
+#   python benchmarks/fake_newsapi.py --port 8099 --delay 0.2
+#   NEWSAPI_BASE_URL=http://127.0.0.1:8099/v2 python medicare_dashboard.py
+
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+#news outlets returned by the sources endpoint
+fake_sources = [{"id": "abc-news", "name": "ABC News"},
+                {"id": "associated-press", "name": "Associated Press"},
+                {"id": "cnn", "name": "CNN"},
+                {"id": "reuters", "name": "Reuters"},
+                {"id": "the-washington-post", "name": "The Washington Post"}]
+
+#function to return a list of fake articles, spread across the news outlets and published an hour apart
+def make_articles(topic, narticles):
+
+    now = datetime.utcnow()
+
+    return [{"source": {"id": fake_sources[i%len(fake_sources)]["id"], "name": fake_sources[i%len(fake_sources)]["name"]},
+             "author": "Author " + str(i),
+             "title": topic.title() + " article " + str(i),
+             "url": "https://example.com/" + topic.replace(" ", "-") + "/" + str(i),
+             "publishedAt": (now - timedelta(hours = i)).strftime("%Y-%m-%dT%H:%M:%SZ")} for i in range(narticles)]
+
+#request handler serving the fake responses after the configured delay
+class FakeNewsHandler(BaseHTTPRequestHandler):
+
+    delay = 0
+    narticles = 20
+
+    def do_GET(self):
+
+        url = urlparse(self.path)
+        params = {key: val[0] for key, val in parse_qs(url.query).items()}
+
+        if url.path.endswith("/sources"):
+            body = {"status": "ok", "sources": fake_sources}
+        elif url.path.endswith("/top-headlines"):
+            body = {"status": "ok", "articles": make_articles(params.get("category", "general"), self.narticles)}
+        elif url.path.endswith("/everything"):
+            body = {"status": "ok", "articles": make_articles(params.get("q", ""), self.narticles)}
+        else:
+            self.send_error(404)
+            return
+
+        time.sleep(self.delay)
+
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    #keep the console quiet during load tests
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Local stand-in for the news api used by the Medicare Utilization Dashboard")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8099)
+    parser.add_argument("--delay", type = float, default = 0,
+                        help = "seconds to wait before answering each request, to mimic a slow upstream")
+    parser.add_argument("--articles", type = int, default = 20,
+                        help = "number of articles returned by top-headlines and everything")
+    args = parser.parse_args()
+
+    FakeNewsHandler.delay = args.delay
+    FakeNewsHandler.narticles = args.articles
+
+    server = ThreadingHTTPServer((args.host, args.port), FakeNewsHandler)
+    print("Serving fake news api on http://{0}:{1}/v2".format(args.host, args.port))
+    server.serve_forever()
@@ -0,0 +1,328 @@
+#******************************************************************************
+#SYNTHETIC CMS INPUT FILES
+#******************************************************************************
+
+#writes home health, hospice and hospital compare files with the same file names, columns and value formats as the CMS files read by the dashboard,
+#filled with random providers, so that the dashboard can be loaded and benchmarked without the real files. --scale sets the number of providers
+#as a multiple of the real files (1x, 10x, 100x...):
+#   python benchmarks/make_synthetic_data.py --scale 10
+#   MEDICARE_DATA_DIR=benchmarks/data/10x python medicare_dashboard.py
+
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+#number of providers in the real files (HH_Provider_Oct2020, Hospice_Provider_Nov2020 and Payment_and_Value_of_Care-Hospital)
+real_nproviders = {"hha": 11400, "hs": 5041, "ho": 4700}
+
+#number of providers written at a time, so that the 100x files are never held in memory at once
+chunk_nproviders = 20000
+
+#U.S states and territories found in the CMS files, with the CMS region of each
+state_regions = {"AK": 10, "AL": 4, "AR": 6, "AZ": 9, "CA": 9, "CO": 8, "CT": 1, "DC": 3, "DE": 3, "FL": 4, "GA": 4, "GU": 9, "HI": 9, "IA": 7,
+                 "ID": 10, "IL": 5, "IN": 5, "KS": 7, "KY": 4, "LA": 6, "MA": 1, "MD": 3, "ME": 1, "MI": 5, "MN": 5, "MO": 7, "MP": 9, "MS": 4,
+                 "MT": 8, "NC": 4, "ND": 8, "NE": 7, "NH": 1, "NJ": 2, "NM": 6, "NV": 9, "NY": 2, "OH": 5, "OK": 6, "OR": 10, "PA": 3, "PR": 2,
+                 "RI": 1, "SC": 4, "SD": 8, "TN": 4, "TX": 6, "UT": 8, "VA": 3, "VI": 2, "VT": 1, "WA": 10, "WI": 5, "WV": 3, "WY": 8}
+states = np.array(sorted(state_regions))
+
+#share of providers in each state, weighted towards the large states as in the real files
+state_weights = np.array([{"CA": 12, "TX": 14, "FL": 6, "IL": 5, "OH": 4, "MI": 4, "NY": 3, "PA": 3}.get(st, 1) for st in states], dtype = "float64")
+state_weights = state_weights/state_weights.sum()
+
+#number of cities and counties per state
+ncities_per_state = 60
+ncounties_per_state = 30
+
+#------------------------------------------------------------------------------
+
+hha_ownership_types = ["PROPRIETARY", "NON-PROFIT", "GOVERNMENT - STATE/ COUNTY", "GOVERNMENT - COMBINATION GOVT & VOLUNTARY", "GOVERNMENT - LOCAL"]
+hha_ownership_weights = [0.8, 0.15, 0.03, 0.01, 0.01]
+
+hha_ppr_types = ["Better Than National Rate", "No Different Than National Rate", "Worse Than National Rate", "Not Available"]
+hha_ppr_weights = [0.05, 0.6, 0.05, 0.3]
+
+hha_offer_columns = ["Offers Nursing Care Services", "Offers Physical Therapy Services", "Offers Occupational Therapy Services",
+                     "Offers Speech Pathology Services", "Offers Medical Social Services", "Offers Home Health Aide Services"]
+hha_offer_rates = [0.99, 0.98, 0.9, 0.85, 0.8, 0.85]
+
+#percent metrics of the home health file. the star rating and the spending ratio are written separately
+hha_pct_metrics = ["How often the home health team began their patients' care in a timely manner",
+                   "How often the home health team checked patients' risk of falling",
+                   "How often the home health team checked patients for depression",
+                   "How often the home health team determined whether patients received a flu shot for the current flu season",
+                   "How often the home health team made sure that their patients received a pneumococcal vaccine (pneumonia shot)",
+                   "With diabetes, how often the home health team got doctor's orders, gave foot care, and taught patients about foot care",
+                   "How often patients got better at walking or moving around",
+                   "How often patients got better at getting in and out of bed",
+                   "How often patients got better at bathing",
+                   "How often patients' breathing improved",
+                   "How often patients' wounds improved or healed after an operation",
+                   "How often patients got better at taking their drugs correctly by mouth",
+                   "How often home health patients had to be admitted to the hospital",
+                   "How often patients receiving home health care needed urgent, unplanned care in the ER without being admitted",
+                   "Changes in skin integrity post-acute care: pressure ulcer/injury",
+                   "How often physician-recommended actions to address medication issues were completely timely"]
+hha_star_metric = "Quality of patient care star rating"
+hha_spend_metric = "How much Medicare spends on an episode of care at this agency, compared to Medicare spending across all agencies nationally"
+
+#------------------------------------------------------------------------------
+
+#hospice quality measures as (measure code, measure name)
+hs_measures = [("H_001_01", "Hospice and Palliative Care Treatment Preferences"),
+               ("H_002_01", "Beliefs & Values Addressed (if desired by the patient)"),
+               ("H_003_01", "Hospice and Palliative Care Pain Screening"),
+               ("H_004_01", "Hospice and Palliative Care Pain Assessment"),
+               ("H_005_01", "Hospice and Palliative Care Dyspnea Screening"),
+               ("H_006_01", "Hospice and Palliative Care Dyspnea Treatment"),
+               ("H_007_01", "Patient Treated with an Opioid Who Are Given a Bowel Regimen"),
+               ("H_008_01", "Hospice and Palliative Care Composite Process Measure"),
+               ("H_009_01", "Hospice Visits When Death Is Imminent, Measure 1")]
+
+#rows written for each hospice as (measure code, measure name, start date, end date, score type). every quality measure is preceded by its
+#denominator row, which has no measure name
+hs_rows = []
+for msr_code, msr_name in hs_measures:
+    hs_rows.append((msr_code + "_DENOMINATOR", "", "01/01/2019", "12/31/2019", "count"))
+    hs_rows.append((msr_code + "_OBSERVED", msr_name, "01/01/2019", "12/31/2019", "pct"))
+hs_rows += [("Average_Daily_Census", "Average Daily Census", "01/01/2017", "12/31/2017", "count"),
+            ("Provided_Home_Care_and_other", "Provided Routine Home Care and other levels of care", "01/01/2015", "12/31/2017", "pct"),
+            ("Provided_Home_Care_only", "Provided Routine Home Care only", "01/01/2015", "12/31/2017", "pct"),
+            ("Pct_Pts_w_Cancer", "Percent of Patients with Cancer", "01/01/2017", "12/31/2017", "pct"),
+            ("Pct_Pts_w_Dementia", "Percent of Patients with Dementia", "01/01/2017", "12/31/2017", "pct"),
+            ("Pct_Pts_w_Stroke", "Percent of Patients with Stroke", "01/01/2017", "12/31/2017", "pct"),
+            ("Pct_Pts_w_Circ_Heart_Disease", "Percent of Patients with Circulatory/heart disease", "01/01/2017", "12/31/2017", "pct"),
+            ("Pct_Pts_w_Resp_Disease", "Percent of Patients with Respiratory disease", "01/01/2017", "12/31/2017", "pct"),
+            ("Pct_Pts_w_other_conditions", "Percent of Patients with Other Conditions", "01/01/2017", "12/31/2017", "pct"),
+            ("Care_Provided_Home", "Care Provided in Home", "01/01/2017", "12/31/2017", "pct"),
+            ("Care_Provided_Assisted_Living", "Care Provided in Assisted Living Facility", "01/01/2017", "12/31/2017", "pct"),
+            ("Care_Provided_Nursing_Facility", "Care Provided in Nursing Facility", "01/01/2017", "12/31/2017", "pct"),
+            ("Care_Provided_Skilled_Nursing", "Care Provided in Skilled Nursing Facility", "01/01/2017", "12/31/2017", "pct"),
+            ("Care_Provided_Inpatient_Hospital", "Care Provided in Inpatient Hospital Facility", "01/01/2017", "12/31/2017", "pct"),
+            ("Care_Provided_Inpatient_Hospice", "Care Provided in Inpatient Hospice Facility", "01/01/2017", "12/31/2017", "pct"),
+            ("Care_Provided_other_locations", "Care Provided in All other locations", "01/01/2017", "12/31/2017", "pct")]
+
+#function to return the hospice rows of the release published nyears before the real file, whose measure periods all end nyears earlier
+def shift_hs_rows(nyears):
+
+    return [(msr_code, msr_name, start_dt[:6] + str(int(start_dt[6:]) - nyears), end_dt[:6] + str(int(end_dt[6:]) - nyears), score_type)
+            for msr_code, msr_name, start_dt, end_dt, score_type in hs_rows]
+
+#------------------------------------------------------------------------------
+
+#hospital payment measures as (measure id, measure name, value of care display id)
+ho_measures = [("PAYM_30_AMI", "Payment for heart attack patients", "MORT_PAYM_30_AMI"),
+               ("PAYM_30_HF", "Payment for heart failure patients", "MORT_PAYM_30_HF"),
+               ("PAYM_30_PN", "Payment for pneumonia patients", "MORT_PAYM_30_PN"),
+               ("PAYM_90_HIP_KNEE", "Payment for hip/knee replacement patients", "COMP_PAYM_90_HIP_KNEE")]
+
+ho_pmt_categories = ["No Different Than the National Average Payment", "Greater Than the National Average Payment",
+                     "Less Than the National Average Payment", "Number of Cases Too Small", "Not Available"]
+ho_pmt_weights = [0.45, 0.12, 0.1, 0.18, 0.15]
+
+ho_value_categories = ["Average Mortality and Average Payment", "Average Mortality and Higher Payment", "Average Mortality and Lower Payment",
+                       "Better Mortality and Average Payment", "Better Mortality and Higher Payment", "Better Mortality and Lower Payment",
+                       "Worse Mortality and Average Payment", "Worse Mortality and Higher Payment", "Worse Mortality and Lower Payment",
+                       "Not Available"]
+ho_value_weights = [0.4, 0.06, 0.06, 0.05, 0.02, 0.01, 0.03, 0.01, 0.01, 0.35]
+
+#national average payment of each measure
+ho_avg_payments = [25000, 17000, 18000, 21000]
+
+#------------------------------------------------------------------------------
+
+#function to pick the state, city, county and address of each provider
+def make_locations(rng, nproviders):
+
+    st_idx = rng.choice(len(states), size = nproviders, p = state_weights)
+    city_idx = rng.integers(0, ncities_per_state, nproviders)
+    county_idx = rng.integers(0, ncounties_per_state, nproviders)
+
+    st = states[st_idx]
+    city = np.char.add(np.char.add(st, " CITY "), city_idx.astype(str))
+    county = np.char.add(np.char.add(st, " County "), county_idx.astype(str))
+    zip_code = np.char.zfill((st_idx*1000 + city_idx*10 + 10001).astype(str), 5)
+    address = np.char.add(rng.integers(1, 9999, nproviders).astype(str), " MAIN STREET")
+    phone = np.char.add("(555) 555-", np.char.zfill(rng.integers(0, 10000, nproviders).astype(str), 4))
+
+    return st, city, county, zip_code, address, phone
+
+#function to return percent scores, with the given share of scores missing (NaN)
+def make_pct_scores(rng, n, missing_rate, ndigits = 1):
+
+    scores = np.round(np.clip(rng.normal(80, 15, n), 0, 100), ndigits)
+    scores[rng.random(n) < missing_rate] = np.nan
+
+    return scores
+
+#function to write a chunk of rows to a csv file, writing the header with the first chunk
+def write_chunk(df, filepath, first_chunk):
+
+    df.to_csv(filepath, mode = "w" if first_chunk else "a", header = first_chunk, index = False)
+
+#------------------------------------------------------------------------------
+
+#function to return a chunk of the home health file for the providers numbered from first_id
+def make_hha_chunk(rng, first_id, nproviders):
+
+    st, city, county, zip_code, address, phone = make_locations(rng, nproviders)
+    ccn = np.char.zfill(np.arange(first_id, first_id + nproviders).astype(str), 6)
+
+    df = pd.DataFrame({"State": st,
+                       "CMS Certification Number (CCN)": ccn,
+                       "Provider Name": np.char.add("HOME HEALTH AGENCY ", ccn),
+                       "Address": address,
+                       "City": city,
+                       "ZIP": zip_code,
+                       "Phone": phone,
+                       "Type of Ownership": rng.choice(hha_ownership_types, size = nproviders, p = hha_ownership_weights)})
+    for off_col, off_rate in zip(hha_offer_columns, hha_offer_rates):
+        df[off_col] = np.where(rng.random(nproviders) < off_rate, "Yes", "No")
+    df["Certification Date"] = pd.to_datetime(rng.integers(0, 365*50, nproviders), unit = "D", origin = "1970-01-01").strftime("%m/%d/%Y")
+
+    #star ratings are given in half stars from 1 to 5
+    star = rng.integers(2, 11, nproviders)/2
+    star[rng.random(nproviders) < 0.2] = np.nan
+    df[hha_star_metric] = star
+    df["Footnote for quality of patient care star rating"] = np.where(np.isnan(star), "The number of patient episodes for this measure is too small to report.", "")
+
+    for metric in hha_pct_metrics:
+        df[metric] = make_pct_scores(rng, nproviders, 0.15)
+        df["Footnote for " + metric[0].lower() + metric[1:]] = np.where(np.isnan(df[metric]), "The number of patient episodes for this measure is too small to report.", "")
+
+    spend = np.round(rng.normal(1, 0.12, nproviders), 2)
+    spend[rng.random(nproviders) < 0.1] = np.nan
+    df[hha_spend_metric] = spend
+    df["PPR Performance Categorization"] = rng.choice(hha_ppr_types, size = nproviders, p = hha_ppr_weights)
+
+    return df
+
+#function to return a chunk of the hospice file (one row per provider and measure) for the providers numbered from first_id
+def make_hs_chunk(rng, first_id, nproviders, rows = hs_rows):
+
+    st, city, county, zip_code, address, phone = make_locations(rng, nproviders)
+    ccn = np.char.zfill(np.arange(first_id, first_id + nproviders).astype(str), 6)
+    nmeasures = len(rows)
+
+    #scores of each provider for each measure, "Not Available" if missing
+    scores = np.empty((nproviders, nmeasures), dtype = object)
+    for i, (msr_code, msr_name, start_dt, end_dt, score_type) in enumerate(rows):
+        if score_type == "count":
+            vals = rng.integers(0, 1500, nproviders).astype(str).astype(object)
+            vals[rng.random(nproviders) < 0.3] = "Not Available"
+        else:
+            vals = make_pct_scores(rng, nproviders, 0.3)
+            vals = np.where(np.isnan(vals), "Not Available", vals.astype(str)).astype(object)
+        scores[:, i] = vals
+
+    df = pd.DataFrame({"CMS Certification Number (CCN)": np.repeat(np.char.add(np.char.add('="', ccn), '"'), nmeasures),
+                       "Facility Name": np.repeat(np.char.add("HOSPICE ", ccn), nmeasures),
+                       "Address Line 1": np.repeat(address, nmeasures),
+                       "Address Line 2": "",
+                       "City": np.repeat(city, nmeasures),
+                       "State": np.repeat(st, nmeasures),
+                       "Zip Code": np.repeat(np.char.add(np.char.add('="', zip_code), '"'), nmeasures),
+                       "County Name": np.repeat(county, nmeasures),
+                       "Phone Number": np.repeat(phone, nmeasures),
+                       "CMS Region": np.repeat([state_regions[s] for s in st], nmeasures),
+                       "Measure Code": np.tile([row[0] for row in rows], nproviders),
+                       "Measure Name": np.tile([row[1] for row in rows], nproviders),
+                       "Score": scores.ravel(),
+                       "Footnote": "",
+                       "Start Date": np.tile([row[2] for row in rows], nproviders),
+                       "End Date": np.tile([row[3] for row in rows], nproviders)})
+    df.loc[df["Score"] == "Not Available", "Footnote"] = "12"
+
+    return df
+
+#function to return a chunk of the hospital file (one row per hospital and payment measure) for the hospitals numbered from first_id
+def make_ho_chunk(rng, first_id, nproviders):
+
+    st, city, county, zip_code, address, phone = make_locations(rng, nproviders)
+    facility_id = np.char.zfill(np.arange(first_id, first_id + nproviders).astype(str), 6)
+    nmeasures = len(ho_measures)
+    nrows = nproviders*nmeasures
+
+    #payment amounts are written as dollar strings, e.g. "$25,317"
+    avg_payment = np.tile(ho_avg_payments, nproviders)
+    payment = np.round(rng.normal(avg_payment, avg_payment*0.08)).astype("int64")
+    pmt_cat = rng.choice(ho_pmt_categories, size = nrows, p = ho_pmt_weights)
+    missing = np.isin(pmt_cat, ["Number of Cases Too Small", "Not Available"])
+    payment_str = np.where(missing, "Not Available", ["${:,}".format(p) for p in payment])
+    lower_str = np.where(missing, "Not Available", ["${:,}".format(p) for p in (payment*0.93).astype("int64")])
+    higher_str = np.where(missing, "Not Available", ["${:,}".format(p) for p in (payment*1.07).astype("int64")])
+    value_cat = rng.choice(ho_value_categories, size = nrows, p = ho_value_weights)
+
+    return pd.DataFrame({"Facility ID": np.repeat(facility_id, nmeasures),
+                         "Facility Name": np.repeat(np.char.add("HOSPITAL ", facility_id), nmeasures),
+                         "Address": np.repeat(address, nmeasures),
+                         "City": np.repeat(city, nmeasures),
+                         "State": np.repeat(st, nmeasures),
+                         "ZIP Code": np.repeat(zip_code, nmeasures),
+                         "County Name": np.repeat(np.char.upper(county), nmeasures),
+                         "Phone Number": np.repeat(phone, nmeasures),
+                         "Payment Measure ID": np.tile([msr[0] for msr in ho_measures], nproviders),
+                         "Payment Measure Name": np.tile([msr[1] for msr in ho_measures], nproviders),
+                         "Payment Category": pmt_cat,
+                         "Denominator": np.where(missing, "Not Available", rng.integers(25, 900, nrows).astype(str)),
+                         "Payment": payment_str,
+                         "Lower Estimate": lower_str,
+                         "Higher Estimate": higher_str,
+                         "Payment Footnote": np.where(missing, "5", ""),
+                         "Value of Care Display ID": np.tile([msr[2] for msr in ho_measures], nproviders),
+                         "Value of Care Display Name": np.tile(["Value of Care " + msr[1][len("Payment for "):] for msr in ho_measures], nproviders),
+                         "Value of Care Category": value_cat,
+                         "Value of Care Footnote": np.where(value_cat == "Not Available", "5", ""),
+                         "Start Date": "07/01/2016",
+                         "End Date": "06/30/2019"})
+
+#------------------------------------------------------------------------------
+
+#input files written by this script, with the function making each chunk and the number of providers in the real file
+synthetic_files = [("HH_Provider_Oct2020.csv", make_hha_chunk, real_nproviders["hha"]),
+                   ("Hospice_Provider_Nov2020.csv", make_hs_chunk, real_nproviders["hs"]),
+                   ("Payment_and_Value_of_Care-Hospital.csv", make_ho_chunk, real_nproviders["ho"])]
+
+#function to write a synthetic input file in chunks of chunk_nproviders providers. returns the number of rows written
+def write_synthetic_file(rng, filepath, make_chunk, nproviders):
+
+    nrows = 0
+    for first_id in range(0, nproviders, chunk_nproviders):
+        df = make_chunk(rng, 10000 + first_id, min(chunk_nproviders, nproviders - first_id))
+        write_chunk(df, filepath, first_id == 0)
+        nrows += len(df)
+
+    return nrows
+
+#function to write the three input files at the given multiple of the real number of providers, and hs_releases - 1 earlier yearly releases of the
+#hospice file (Hospice_Provider_Nov2019, Hospice_Provider_Nov2018...) for the study period to span several releases. returns the number of rows written to each file
+def make_synthetic_data(out_dir, scale = 1, seed = 0, hs_releases = 1):
+
+    os.makedirs(out_dir, exist_ok = True)
+    rng = np.random.default_rng(seed)
+    nrows = {}
+
+    for filename, make_chunk, nreal in synthetic_files:
+        nrows[filename] = write_synthetic_file(rng, os.path.join(out_dir, filename), make_chunk, int(round(nreal*scale)))
+
+    for nyears in range(1, hs_releases):
+        filename = "Hospice_Provider_Nov{0}.csv".format(2020 - nyears)
+        make_chunk = lambda rng, first_id, nproviders: make_hs_chunk(rng, first_id, nproviders, shift_hs_rows(nyears))
+        nrows[filename] = write_synthetic_file(rng, os.path.join(out_dir, filename), make_chunk, int(round(real_nproviders["hs"]*scale)))
+
+    return nrows
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Write synthetic CMS input files for the Medicare Utilization Dashboard")
+    parser.add_argument("--scale", type = float, default = 1,
+                        help = "number of providers as a multiple of the real files, e.g. 1, 10 or 100")
+    parser.add_argument("--out", help = "folder to write the files to (benchmarks/data/<scale>x by default)")
+    parser.add_argument("--seed", type = int, default = 0, help = "seed of the random number generator")
+    parser.add_argument("--hs-releases", type = int, default = 1, help = "number of yearly releases of the hospice file, from Nov2020 back")
+    args = parser.parse_args()
+
+    out_dir = args.out or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "{0:g}x".format(args.scale))
+    for filename, nrows in make_synthetic_data(out_dir, args.scale, args.seed, args.hs_releases).items():
+        print("{0}: {1:,} rows".format(os.path.join(out_dir, filename), nrows))
@@ -1,7 +1,28 @@
+import os
+import sys
+import argparse
+import zipfile
+import glob
+import re
+import shutil
 import pandas as pd
 import numpy as np
+from pandas.api.types import union_categoricals
 from urllib.request import urlopen
 import json
+import functools
+import bisect
+import cProfile
+import random
+import hmac
+import hashlib
+import inspect
+import concurrent.futures
+import multiprocessing
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import flask
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
@@ -9,28 +30,325 @@ import dash_bootstrap_components as dbc
 import dash_table
 from dash.dependencies import Input, Output, State, ALL
 from dash.exceptions import PreventUpdate
+from dash.development.base_component import Component
 import plotly as pyo
+from plotly.utils import PlotlyJSONEncoder
 import plotly.graph_objects as go
 import plotly.express as px
-#pip install newsapi-python
-from newsapi import NewsApiClient
 import requests
+from requests.adapters import HTTPAdapter
+import time
+
+#duckdb is only needed by the optional embedded query backend (see MEDICARE_QUERY_BACKEND in SECTION III)
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
 
 #******************************************************************************
 #SECTION I: READ IN INPUT FILES
 #******************************************************************************
 
+#time at which the dashboard started loading and the seconds spent in each startup phase (see report_startup_timings in SECTION V)
+startup_time = time.perf_counter()
+startup_timings = OrderedDict()
+
+#function to record the seconds spent in a startup phase, i.e. since the previous phase ended
+def end_startup_phase(phase):
+    
+    startup_timings[phase] = time.perf_counter() - startup_time - sum(startup_timings.values())
+
+#folder holding the CMS input files. each file can be saved either as the csv itself or as the zip file downloaded from CMS
+data_dir = os.environ.get("MEDICARE_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+
+#file name pattern of each input file, and the file name used when no file matches. new CMS releases can be saved next to the old ones
+#(e.g. HH_Provider_Oct2020.csv and HH_Provider_Jan2021.zip) and the latest release is read
+input_releases = {"hha": ("HH_Provider_*", "HH_Provider_Oct2020.csv"),
+                  "hs": ("Hospice_Provider_*", "Hospice_Provider_Nov2020.csv"),
+                  "ho": ("Payment_and_Value_of_Care-Hospital*", "Payment_and_Value_of_Care-Hospital.csv")}
+
+#function to return the input files in data_dir matching a file name pattern (saved as csv or zip files), from the oldest to the latest release.
+#releases are ordered by the month and year at the end of the file name (e.g. HH_Provider_Oct2020), then by modification time
+def find_releases(pattern):
+    
+    release_lst = []
+    for base_path in set(os.path.splitext(path)[0] for ext in [".csv", ".zip"] for path in glob.glob(os.path.join(data_dir, pattern + ext))):
+        month_year = re.search(r"([A-Z][a-z]{2}\d{4})$", os.path.basename(base_path))
+        try:
+            release_date = datetime.strptime(month_year.group(1), "%b%Y") if month_year else datetime.min
+        except ValueError:
+            release_date = datetime.min
+        mtime = max(os.path.getmtime(base_path + ext) for ext in [".csv", ".zip"] if os.path.exists(base_path + ext))
+        release_lst.append((release_date, mtime, base_path + ".csv"))
+    
+    return [filepath for release_date, mtime, filepath in sorted(release_lst)]
+
+#function to return the latest nreleases releases of an input file (every release if nreleases is 0) from the oldest to the latest,
+#or the default file name if no file matches the pattern
+def find_latest_releases(pattern, default_name, nreleases = 1):
+    
+    release_lst = find_releases(pattern)
+    if len(release_lst) == 0:
+        return [os.path.join(data_dir, default_name)]
+    
+    return release_lst[-nreleases:] if nreleases > 0 else release_lst
+
+#function to return the latest release of an input file, or the default file name if no file matches the pattern
+def find_latest_release(pattern, default_name):
+    
+    return find_latest_releases(pattern, default_name)[-1]
+
+#number of releases of each input file read in side by side, from the latest. the home health and hospital pages show the latest release only,
+#while the study period of the hospice page spans the measure periods of every hospice release read in (MEDICARE_HS_RELEASES, 0 by default, i.e. every
+#release found in data_dir)
+input_release_history = {"hha": 1,
+                         "hs": int(os.environ.get("MEDICARE_HS_RELEASES", 0)),
+                         "ho": 1}
+
+#function to return the releases of each input file read in by the dashboard, from the oldest to the latest, by setting
+def find_input_releases():
+    
+    return {setting: find_latest_releases(pattern, default_name, input_release_history[setting]) for setting, (pattern, default_name) in input_releases.items()}
+
+input_filepaths = find_input_releases()
+
 #home health compare file
-hha_filepath = r"C:\Users\tcphan\OneDrive\Documents\kaggle_projects\medicare_dashboard\data\HH_Provider_Oct2020.csv"
-hha_df = pd.read_csv(hha_filepath)
+hha_filepath = input_filepaths["hha"][-1]
 
-#hospice compare file
-hs_filepath = r"C:\Users\tcphan\OneDrive\Documents\kaggle_projects\medicare_dashboard\data\Hospice_Provider_Nov2020.csv"
-hs_df = pd.read_csv(hs_filepath)
+#hospice compare files
+hs_filepaths = input_filepaths["hs"]
 
 #hospital compare file
-ho_filepath = r"C:\Users\tcphan\OneDrive\Documents\kaggle_projects\medicare_dashboard\data\Payment_and_Value_of_Care-Hospital.csv"
-ho_df = pd.read_csv(ho_filepath)
+ho_filepath = input_filepaths["ho"][-1]
+
+#folder holding the typed parquet copies of the cleaned input files (see build_input_cache below)
+cache_dir = os.path.join(data_dir, "cache")
+
+#number of rows read in at a time from each input file
+chunk_nrows = int(os.environ.get("MEDICARE_CHUNK_ROWS", 100000))
+
+#------------------------------------------------------------------------------
+
+#list of metric associated with Offers... data columns
+offer_metric_lst = ["Offers Nursing Care Services",
+                    "Offers Physical Therapy Services",
+                    "Offers Occupational Therapy Services",
+                    "Offers Speech Pathology Services",
+                    "Offers Medical Social Services",
+                    "Offers Home Health Aide Services"]    
+
+#list of dropdown menu options for the summary metric for the home health histogram plot
+hh_hist_metrics = ["Quality of patient care star rating",
+                   "How often the home health team began their patients' care in a timely manner",
+                   "How often the home health team checked patients' risk of falling",
+                   "How often the home health team checked patients for depression",
+                   "How often the home health team determined whether patients received a flu shot for the current flu season",
+                   "How often the home health team made sure that their patients received a pneumococcal vaccine (pneumonia shot)",
+                   "With diabetes, how often the home health team got doctor's orders, gave foot care, and taught patients about foot care",
+                   "How often patients got better at walking or moving around",
+                   "How often patients got better at getting in and out of bed",
+                   "How often patients got better at bathing",
+                   "How often patients' breathing improved",
+                   "How often patients' wounds improved or healed after an operation",
+                   "How often patients got better at taking their drugs correctly by mouth",
+                   "How often home health patients had to be admitted to the hospital",
+                   "How often patients receiving home health care needed urgent, unplanned care in the ER without being admitted",
+                   "Changes in skin integrity post-acute care: pressure ulcer/injury",
+                   "How often physician-recommended actions to address medication issues were completely timely",
+                   "How much Medicare spends on an episode of care at this agency, compared to Medicare spending across all agencies nationally"
+                   ]
+
+#columns (and their data types) used by the dashboard from each input file. all other columns are skipped when reading in the file
+hha_columns = {"State": str,
+               "CMS Certification Number (CCN)": str,
+               "Provider Name": str,
+               "Type of Ownership": str,
+               "PPR Performance Categorization": str}
+hha_columns.update({off_val: str for off_val in offer_metric_lst})
+hha_columns.update({hist_val: "float64" for hist_val in hh_hist_metrics})
+
+hs_columns = {"CMS Certification Number (CCN)": str,
+              "Facility Name": str,
+              "State": str,
+              "County Name": str,
+              "Measure Name": str,
+              "Score": str,
+              "Start Date": str,
+              "End Date": str}
+
+ho_columns = {"Facility ID": str,
+              "City": str,
+              "State": str,
+              "Payment Measure Name": str,
+              "Payment Category": str,
+              "Payment": str,
+              "Value of Care Category": str}
+
+#------------------------------------------------------------------------------
+
+#function to clean the home health file
+def clean_hha_df(df):
+    
+    #convert each Offers... column from Yes/No to 1/0 so that it can be summed by state
+    for off_val in offer_metric_lst:
+        df[off_val] = df[off_val].map({"Yes": 1, "No": 0})
+        
+    return df
+
+#columns of the hospice file holding a small set of repeated values, stored as categorical codes instead of strings
+hs_category_columns = ["CMS Certification Number (CCN)", "Facility Name", "State", "County Name", "Measure Name"]
+
+#function to clean the hospice file
+def clean_hs_df(df):
+    
+    #remove quotation marks and equal sign from CCN column
+    df["CMS Certification Number (CCN)"] = df["CMS Certification Number (CCN)"].str.replace('"', "")
+    df["CMS Certification Number (CCN)"] = df["CMS Certification Number (CCN)"].str.replace('=', "")
+    
+    #convert score to numeric once. scores that are "Not Available" (or not numeric, such as Yes/No) are stored as NaN
+    df["Score"] = pd.to_numeric(df["Score"], errors = "coerce").astype("float32")
+    
+    #only the year of the start and end date of each measure period is used by the dashboard
+    df["Start Year"] = pd.to_datetime(df["Start Date"], format = "%m/%d/%Y").dt.year.astype("int16")
+    df["End Year"] = pd.to_datetime(df["End Date"], format = "%m/%d/%Y").dt.year.astype("int16")
+    df = df.drop(columns = ["Start Date", "End Date"])
+    
+    for cat_col in hs_category_columns:
+        df[cat_col] = df[cat_col].astype("category")
+    
+    return df
+
+#columns identifying a provider's score for a measure period in the hospice file. when the same score is found in several releases, the latest release wins
+hs_release_keys = ["CMS Certification Number (CCN)", "Measure Name", "Start Year", "End Year"]
+
+#function to clean the hospital file
+def clean_ho_df(df):
+    
+    #convert text dollar string into numeric amount. payments that are "Not Available" are stored as NaN
+    df["Payment"] = pd.to_numeric(df["Payment"].str.replace("$", "", regex = False).str.replace(",", "", regex = False), errors = "coerce")
+    
+    #replace the payment measure name with the label shown in the measure dropdown menu (e.g. "Payment for heart attack patients" becomes "Heart Attack Measure"),
+    #stored as a categorical code
+    df["Payment Measure"] = (df["Payment Measure Name"].str.replace("Payment for ", "", regex = False).str.replace("patients", "", regex = False).str.strip().str.title() + " Measure").astype("category")
+    df = df.drop(columns = ["Payment Measure Name"])
+    
+    return df
+
+#------------------------------------------------------------------------------
+
+#function to return the file to read for a given input file: the csv if it exists, otherwise the zip file of the same name
+def get_source_path(filepath):
+    
+    zip_path = os.path.splitext(filepath)[0] + ".zip"
+    
+    if not os.path.exists(filepath) and os.path.exists(zip_path):
+        return zip_path
+    
+    return filepath
+
+#function to stream an input file in chunks, keeping only the given columns and cleaning each chunk as it is read
+def read_input_file(filepath, columns, clean_func):
+    
+    source_path = get_source_path(filepath)
+    
+    if source_path.endswith(".zip"):
+        with zipfile.ZipFile(source_path) as zip_file:
+            #use the csv of the same name inside the zip file, otherwise the first csv found
+            csv_names = [name for name in zip_file.namelist() if name.lower().endswith(".csv")]
+            csv_name = os.path.basename(filepath) if os.path.basename(filepath) in csv_names else csv_names[0]
+            with zip_file.open(csv_name) as csv_file:
+                return read_csv_chunks(csv_file, columns, clean_func)
+    
+    return read_csv_chunks(source_path, columns, clean_func)
+
+#function to read in a csv in chunks of chunk_nrows rows. only the cleaned chunks are held in memory, not the full raw file
+def read_csv_chunks(csv_file, columns, clean_func):
+    
+    reader = pd.read_csv(csv_file, usecols = list(columns), dtype = columns, chunksize = chunk_nrows)
+    chunk_lst = [clean_func(chunk) for chunk in reader]
+    
+    return concat_chunks(chunk_lst)
+
+#function to stack the cleaned chunks of an input file column by column. categorical columns are merged on their codes so they are never expanded back into strings
+def concat_chunks(chunk_lst):
+    
+    df_dict = {}
+    for col in chunk_lst[0].columns:
+        if isinstance(chunk_lst[0][col].dtype, pd.CategoricalDtype):
+            df_dict[col] = union_categoricals([chunk[col] for chunk in chunk_lst], sort_categories = True)
+        else:
+            df_dict[col] = pd.concat([chunk[col] for chunk in chunk_lst], ignore_index = True)
+    
+    return pd.DataFrame(df_dict)
+
+#function to return the location of the cached copy of an input file. the file name holds a hash of the columns read in, of the cleaning function and of
+#the lists of columns it reads (e.g. hs_category_columns), so that a copy cleaned by an earlier version of this file is never read back
+def get_cache_path(filepath, columns, clean_func):
+    
+    cache_key = hashlib.sha256(repr(sorted((col, str(dtype)) for col, dtype in columns.items())).encode("utf-8"))
+    cache_key.update(inspect.getsource(clean_func).encode("utf-8"))
+    cache_key.update(repr([(name, clean_func.__globals__[name]) for name in clean_func.__code__.co_names if isinstance(clean_func.__globals__.get(name), list)]).encode("utf-8"))
+    
+    return os.path.join(cache_dir, "{0}.{1}.parquet".format(os.path.splitext(os.path.basename(filepath))[0], cache_key.hexdigest()[:12]))
+
+#function to read in and clean an input file. the cached copy is used whenever it is at least as recent as the source file
+def load_input_file(filepath, columns, clean_func):
+    
+    cache_path = get_cache_path(filepath, columns, clean_func)
+    source_path = get_source_path(filepath)
+    
+    if os.path.exists(cache_path) and (not os.path.exists(source_path) or os.path.getmtime(cache_path) >= os.path.getmtime(source_path)):
+        try:
+            return pd.read_parquet(cache_path)
+        except (ImportError, OSError, ValueError) as err:
+            #fall back to the source file if the cache cannot be read (e.g. pyarrow is not installed or the file is corrupt)
+            print("Unable to read cached file {0}: {1}".format(cache_path, err))
+    
+    return read_input_file(filepath, columns, clean_func)
+
+#function to write the cleaned version of an input file to the cache
+def write_input_cache(df, filepath, columns, clean_func):
+    
+    cache_path = get_cache_path(filepath, columns, clean_func)
+    os.makedirs(cache_dir, exist_ok = True)
+    
+    #write to a temporary file first so that running dashboards never read a partially written cache
+    tmp_path = cache_path + ".tmp"
+    df.to_parquet(tmp_path, index = False)
+    os.replace(tmp_path, cache_path)
+    
+    return cache_path
+
+#function to re-read each source file and rebuild its cached copy. each release has its own cached copy, so loading a new release only reads the new file
+def build_input_cache():
+    
+    input_files = [(hha_filepath, hha_columns, clean_hha_df)] + [(filepath, hs_columns, clean_hs_df) for filepath in hs_filepaths] + [(ho_filepath, ho_columns, clean_ho_df)]
+    for filepath, columns, clean_func in input_files:
+        df = read_input_file(filepath, columns, clean_func)
+        print("Wrote {0} ({1:,} rows)".format(write_input_cache(df, filepath, columns, clean_func), len(df)))
+
+#function to read in the given releases of the hospice file (from the oldest to the latest) and merge them into one dataset. each provider's score
+#for a measure period is taken from the latest release reporting it, so that restated scores replace the ones of earlier releases
+def load_hs_releases(filepaths):
+    
+    release_lst = [load_input_file(filepath, hs_columns, clean_hs_df) for filepath in filepaths]
+    if len(release_lst) == 1:
+        return release_lst[0]
+    
+    df = concat_chunks([release_df.assign(Release = np.int16(release_ind)) for release_ind, release_df in enumerate(release_lst)])
+    
+    #group on the category codes rather than the categories, so that rows without a measure name (e.g. denominators) are kept as well
+    key_lst = [df[col].cat.codes if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col] for col in hs_release_keys]
+    latest_release = df["Release"].groupby(key_lst).transform("max")
+    
+    return df[df["Release"] == latest_release].drop(columns = ["Release"]).reset_index(drop = True)
+
+
+hha_df = load_input_file(hha_filepath, hha_columns, clean_hha_df)
+hs_df = load_hs_releases(hs_filepaths)
+ho_df = load_input_file(ho_filepath, ho_columns, clean_ho_df)
+
+end_startup_phase("read input files")
 
 #******************************************************************************
 #SECTION II: DEFINE FORMATTING PARAMETERS
@@ -73,128 +391,724 @@ choro_metric_descrip = ["The total number of Home Health Agencies for each U.S s
 #match each metric with its corresponding description
 choro_metric_dict = {i[0]: i[1] for i in zip(choro_metrics, choro_metric_descrip)}
 
-#list of U.S states found in HHA dataset
-hha_choro_states = hha_df["State"].dropna().unique()
-len_states = len(hha_choro_states)
+#number of columns of U.S state buttons next to the choropleth map
 ncol_for_states = 5
-nstates_per_col = int(len_states/ncol_for_states)
 
-#list of ownership type
-hha_ownership_types = hha_df["Type of Ownership"].dropna().unique()
-#list of PPR performance category types
-hha_ppr_types = hha_df["PPR Performance Categorization"].dropna().unique()
+#list of dropdown menu options for the comparison type for the home health histogram plot
+hh_hist_compare_type = ["State", "Type of Ownership", "PPR Performance Categorization"]
 
+#function to return the options of the dropdown menus, sliders and buttons found in the input datasets, by variable name (see build_data_snapshot)
+def build_data_options(hha_df, hs_df, ho_df):
+    
+    options = {}
+    
+    #list of U.S states found in HHA dataset
+    options["hha_choro_states"] = hha_df["State"].dropna().unique()
+    options["len_states"] = len(options["hha_choro_states"])
+    options["nstates_per_col"] = int(options["len_states"]/ncol_for_states)
+    
+    #list of ownership type
+    options["hha_ownership_types"] = hha_df["Type of Ownership"].dropna().unique()
+    #list of PPR performance category types
+    options["hha_ppr_types"] = hha_df["PPR Performance Categorization"].dropna().unique()
+    
+    #list of US states for hospice content page
+    options["hs_states"] = hs_df["State"].dropna().unique().tolist()
+    
+    #list of hospice measures
+    options["hs_measures"] = hs_df["Measure Name"].dropna().unique().tolist()
+    
+    #list of starting years for hospice content page
+    options["hs_start_years"] = hs_df["Start Year"].unique()
+    
+    #list of ending years for hospice content page
+    options["hs_end_years"] = hs_df["End Year"].unique()
+    
+    #list of US states for hospital content page
+    options["ho_states"] = ho_df["State"].dropna().unique()
+    
+    #list of hospital measure names
+    options["ho_measures"] = ho_df["Payment Measure"].dropna().unique().tolist()
+    
+    #list of value categories
+    options["ho_val_cat"] = ho_df["Value of Care Category"].dropna().unique()
+    #list of payment categories
+    options["ho_pmt_cat"] = ho_df["Payment Category"].dropna().unique()
+    
+    return options
 
-#list of metric associated with Offers... data columns
-offer_metric_lst = ["Offers Nursing Care Services",
-                    "Offers Physical Therapy Services",
-                    "Offers Occupational Therapy Services",
-                    "Offers Speech Pathology Services",
-                    "Offers Medical Social Services",
-                    "Offers Home Health Aide Services"]    
+#list of possible news category
+news_categories = ["Business", "Entertainment", "General", "Health", "Science", "Sports", "Technology"]
 
-#list of dropdown menu options for the summary metric for the home health histogram plot
-hh_hist_metrics = ["Quality of patient care star rating",
-                   "How often the home health team began their patients' care in a timely manner",
-                   "How often the home health team checked patients' risk of falling",
-                   "How often the home health team checked patients for depression",
-                   "How often the home health team determined whether patients received a flu shot for the current flu season",
-                   "How often the home health team made sure that their patients received a pneumococcal vaccine (pneumonia shot)",
-                   "With diabetes, how often the home health team got doctor's orders, gave foot care, and taught patients about foot care",
-                   "How often patients got better at walking or moving around",
-                   "How often patients got better at getting in and out of bed",
-                   "How often patients got better at bathing",
-                   "How often patients' breathing improved",
-                   "How often patients' wounds improved or healed after an operation",
-                   "How often patients got better at taking their drugs correctly by mouth",
-                   "How often home health patients had to be admitted to the hospital",
-                   "How often patients receiving home health care needed urgent, unplanned care in the ER without being admitted",
-                   "Changes in skin integrity post-acute care: pressure ulcer/injury",
-                   "How often physician-recommended actions to address medication issues were completely timely",
-                   "How much Medicare spends on an episode of care at this agency, compared to Medicare spending across all agencies nationally"
-                   ]
+#------------------------------------------------------------------------------
 
-#list of dropdown menu options for the comparison type for the home health histogram plot
-hh_hist_compare_type = ["State", "Type of Ownership", "PPR Performance Categorization"]
+#news api settings. NEWSAPI_BASE_URL can point at a local stand-in server (e.g. benchmarks/fake_newsapi.py) for load tests
+apikey = os.environ.get("NEWSAPI_KEY", "2cab0d8e7b89467e9a953f33281425b5")
+#apikey = "da8e2e705b914f9f86ed2e9692e66012"
+news_base_url = os.environ.get("NEWSAPI_BASE_URL", "https://newsapi.org/v2").rstrip("/")
+#seconds to wait on the news api before giving up (connect, read)
+news_timeout = (float(os.environ.get("NEWSAPI_CONNECT_TIMEOUT", 3)), float(os.environ.get("NEWSAPI_READ_TIMEOUT", 5)))
+#seconds a news response is served from the cache before it is refreshed in the background
+news_cache_ttl = float(os.environ.get("NEWSAPI_CACHE_TTL", 600))
+#seconds a failed news request is remembered, returning an empty response right away instead of waiting on the news api again
+news_error_ttl = float(os.environ.get("NEWSAPI_ERROR_TTL", 30))
+#seconds after which a cached news response that could not be refreshed is dropped
+news_cache_max_age = float(os.environ.get("NEWSAPI_CACHE_MAX_AGE", 86400))
+#maximum number of news responses held in the cache, evicting the least recently used first
+news_cache_max_entries = int(os.environ.get("NEWSAPI_CACHE_ENTRIES", 256))
+
+#session reusing pooled connections to the news api across callbacks
+news_session = requests.Session()
+news_session.mount(news_base_url, HTTPAdapter(pool_connections = 4, pool_maxsize = 16))
+
+#cache of news api responses by endpoint and query parameters, from the least to the most recently used: key -> (time fetched, response json, or None
+#if the request failed). the lock also guards news_refreshing, the keys being refreshed in the background, so that each key is refreshed by a single
+#thread at a time, and the refresh thread pool
+news_cache = OrderedDict()
+news_cache_lock = threading.Lock()
+news_refreshing = set()
+news_refresh_pool = None
+news_refresh_pid = None
+
+#function to return the thread pool refreshing news responses in the background, called with news_cache_lock held. threads do not survive a fork,
+#so a worker process forked from a loaded app (e.g. gunicorn --preload) starts its own pool and forgets the keys its parent was refreshing
+def get_news_refresh_pool():
+    
+    global news_refresh_pool, news_refresh_pid
+    
+    if news_refresh_pid != os.getpid():
+        news_refresh_pool = concurrent.futures.ThreadPoolExecutor(max_workers = 2, thread_name_prefix = "news_refresh")
+        news_refresh_pid = os.getpid()
+        news_refreshing.clear()
+    
+    return news_refresh_pool
+
+#function to request an endpoint of the news api and return its json response
+def fetch_news_json(endpoint, params):
+    
+    news_request = news_session.get(news_base_url + "/" + endpoint, params = dict(params, apiKey = apikey), timeout = news_timeout)
+    news_request.raise_for_status()
+    
+    return news_request.json()
+
+#function to store a news api response (None if the request failed) in the cache, evicting the least recently used responses beyond news_cache_max_entries
+def put_news_json(key, news_json):
+    
+    with news_cache_lock:
+        news_cache[key] = (time.monotonic(), news_json)
+        news_cache.move_to_end(key)
+        while len(news_cache) > news_cache_max_entries:
+            news_cache.popitem(last = False)
+
+#function to refresh a cached news response. on failure a stale response is kept and the next request tries again, while a failed request is
+#remembered for another news_error_ttl seconds
+def refresh_news_json(key):
+    
+    try:
+        put_news_json(key, fetch_news_json(key[0], dict(key[1])))
+    except (requests.RequestException, ValueError):
+        with news_cache_lock:
+            cached = news_cache.get(key)
+        if cached is None or cached[1] is None:
+            put_news_json(key, None)
+    finally:
+        with news_cache_lock:
+            news_refreshing.discard(key)
+
+#function to return the json response of a news api endpoint from the cache. stale responses are returned right away and refreshed in the background;
+#only a response that has never been fetched (or was dropped from the cache) is requested while the callback waits. if the news api cannot be reached
+#an empty response is returned, and returned right away by later calls until the request is retried in the background
+def get_news_json(endpoint, params, empty_json = {"articles": []}):
+    
+    key = (endpoint, tuple(sorted(params.items())))
+    with news_cache_lock:
+        cached = news_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] > news_cache_max_age:
+            del news_cache[key]
+            cached = None
+        if cached is not None:
+            news_cache.move_to_end(key)
+            if time.monotonic() - cached[0] > (news_cache_ttl if cached[1] is not None else news_error_ttl) and key not in news_refreshing:
+                get_news_refresh_pool().submit(refresh_news_json, key)
+                news_refreshing.add(key)
+    if cached is not None:
+        return empty_json if cached[1] is None else cached[1]
+    
+    try:
+        news_json = fetch_news_json(endpoint, params)
+    except (requests.RequestException, ValueError):
+        news_json = None
+    put_news_json(key, news_json)
+    
+    return empty_json if news_json is None else news_json
+
+#news outlets offered before the news api has been reached, if no list was saved by an earlier run
+news_fallback_outlets = [("abc-news", "ABC News"),
+                         ("associated-press", "Associated Press"),
+                         ("cbs-news", "CBS News"),
+                         ("cnn", "CNN"),
+                         ("fox-news", "Fox News"),
+                         ("nbc-news", "NBC News"),
+                         ("reuters", "Reuters"),
+                         ("the-washington-post", "The Washington Post"),
+                         ("usa-today", "USA Today")]
+
+#file saving the news outlets of the last successful request to the news api
+news_outlets_path = os.path.join(cache_dir, "news_outlets.json")
+
+#list of possible news outlets as (id, name), and the process that requested the current list. loaded on first use by get_news_outlets
+news_outlets = None
+news_outlets_pid = None
+
+#function to request the news outlets from the news api, then save them and rebuild the pages showing them. runs in the background
+def refresh_news_outlets():
+    
+    global news_outlets
+    
+    news_sources = get_news_json("sources", {}, {"sources": []})
+    if len(news_sources["sources"]) > 0:
+        news_outlets = [(i["id"], i["name"]) for i in news_sources["sources"]]
+        content_pages.pop("ho", None)
+        try:
+            write_file_atomic(news_outlets_path, json.dumps(news_outlets))
+        except OSError as err:
+            print("Unable to save news outlets to {0}: {1}".format(news_outlets_path, err))
+
+#function to return the list of possible news outlets without waiting on the news api. the first call returns the list saved by an earlier run
+#(or the fallback list), and the first call in each process requests the current list in the background
+def get_news_outlets():
+    
+    global news_outlets, news_outlets_pid
+    
+    if news_outlets is None:
+        try:
+            with open(news_outlets_path) as in_file:
+                news_outlets = [tuple(outlet) for outlet in json.load(in_file)]
+        except (OSError, ValueError):
+            news_outlets = news_fallback_outlets
+    with news_cache_lock:
+        if news_outlets_pid != os.getpid():
+            get_news_refresh_pool().submit(refresh_news_outlets)
+            news_outlets_pid = os.getpid()
+    
+    return news_outlets
+
+end_startup_phase("formatting parameters and options")
 
-#------------------------------------------------------------------------------
+#******************************************************************************
+#SECTION III: CLEAN/PROCESS INPUT FILES AND SUMMARY STATISTICS
+#******************************************************************************
 
-#remove quotation marks and equal sign from CCN column
-hs_df["CMS Certification Number (CCN)"] = hs_df["CMS Certification Number (CCN)"].str.replace('"', "")
-hs_df["CMS Certification Number (CCN)"] = hs_df["CMS Certification Number (CCN)"].str.replace('=', "")
+#function to summarize the home health dataset by state: number of providers, mean star rating and spending, and percent of providers offering each service
+def build_hha_summary(df):
+    
+    hha_summ_df_st = df.groupby("State").aggregate({"CMS Certification Number (CCN)": "nunique", #total number of unique hha provider by state
+                                                    "Quality of patient care star rating": "mean", #average patient star rating by state
+                                                    "How much Medicare spends on an episode of care at this agency, compared to Medicare spending across all agencies nationally": "mean"}).reset_index()
+    #rename columns
+    hha_summ_df_st = hha_summ_df_st.rename(columns = {"CMS Certification Number (CCN)": "Total Number of Providers", 
+                                                      "Quality of patient care star rating": "Quality of Patient Care",
+                                                      "How much Medicare spends on an episode of care at this agency, compared to Medicare spending across all agencies nationally": "Medicare Spending per Episode per Provider"})
+    #round results
+    hha_summ_df_st["Quality of Patient Care"] = round(hha_summ_df_st["Quality of Patient Care"], 2)
+    hha_summ_df_st["Medicare Spending per Episode per Provider"] = round(hha_summ_df_st["Medicare Spending per Episode per Provider"], 2)
+    
+    #loop through each column and calculate the percentage of providers in each state with Offers... equal to Yes
+    for off_val in offer_metric_lst:
+        inter_hha = df.groupby("State").aggregate({off_val: "sum", "CMS Certification Number (CCN)": "nunique"}).reset_index()
+        inter_hha["% of Providers Offering" + off_val.replace("Offers", "")] = round(inter_hha[off_val]/inter_hha["CMS Certification Number (CCN)"]*100, 1)
+        if off_val == offer_metric_lst[0]:
+            fin_offsumm_df = inter_hha[["State", "% of Providers Offering" + off_val.replace("Offers", "")]]
+        else:
+            fin_offsumm_df = pd.merge(fin_offsumm_df, inter_hha[["State", "% of Providers Offering" + off_val.replace("Offers", "")]], on = "State")
+    
+    #merge results together
+    hha_summ_df_st = pd.merge(hha_summ_df_st, fin_offsumm_df, on = "State")
+    
+    return hha_summ_df_st
 
-#list of US states for hospice content page
-hs_states = hs_df["State"].dropna().unique()
+#------------------------------------------------------------------------------
 
-#list of hospice measures
-hs_measures = hs_df["Measure Name"].dropna().unique()
+#number of bins aimed for in the home health histogram plot
+hh_hist_nbins = 40
 
-#list of starting years for hospice content page
-hs_df["Start Date"] = pd.to_datetime(hs_df["Start Date"])
-hs_start_years = hs_df["Start Date"].dt.year.unique()
+#function to return the bin edges of a home health metric, shared by every comparison group so that the two histograms line up.
+#metrics with few distinct values (e.g. star ratings) get one bin centred on each value, other metrics get bins of a round width (1, 2, 2.5 or 5 times a power of 10)
+def get_hist_bin_edges(values, nbins = hh_hist_nbins):
+    
+    uniq_vals = np.unique(values[~np.isnan(values)])
+    if len(uniq_vals) < 2:
+        center = uniq_vals[0] if len(uniq_vals) == 1 else 0
+        return np.array([center - 0.5, center + 0.5])
+    
+    val_range = uniq_vals[-1] - uniq_vals[0]
+    width = np.diff(uniq_vals).min()
+    if val_range/width <= nbins:
+        start = uniq_vals[0] - width/2
+    else:
+        magnitude = 10**np.floor(np.log10(val_range/nbins))
+        width = magnitude*min(step for step in [1, 2, 2.5, 5, 10] if step*magnitude*nbins >= val_range)
+        start = np.floor(uniq_vals[0]/width)*width
+    
+    nedges = int(np.floor((uniq_vals[-1] - start)/width)) + 2
+    return np.round(start + width*np.arange(nedges), 6)
 
-#list of ending years for hospice content page
-hs_df["End Date"] = pd.to_datetime(hs_df["End Date"])
-hs_end_years = hs_df["End Date"].dt.year.unique()
+#function to precompute the histogram counts and percentiles (min, 25th, 50th, 75th, max) of each home health metric for every group of each comparison type
+def build_hh_hist_cube(df):
+    
+    hist_edges = {}
+    hist_cube = {}
+    for metric in hh_hist_metrics:
+        hist_edges[metric] = get_hist_bin_edges(df[metric].to_numpy(dtype = "float64"))
+        for compare_type in hh_hist_compare_type:
+            for grp, grp_vals in df.groupby(compare_type)[metric]:
+                counts = np.histogram(grp_vals.dropna(), bins = hist_edges[metric])[0]
+                hist_cube[(metric, compare_type, grp)] = (counts, grp_vals.quantile([0, 0.25, 0.5, 0.75, 1]).tolist())
+    
+    return hist_edges, hist_cube
+
+#function to return the histogram counts and percentiles of a metric for a comparison group (empty counts and missing percentiles if the group has no providers)
+def get_hh_hist(metric, compare_type, grp):
+    
+    empty_hist = (np.zeros(len(hh_hist_edges[metric]) - 1, dtype = "int64"), [np.nan]*5)
+    
+    return hh_hist_cube.get((metric, compare_type, grp), empty_hist)
 
 #------------------------------------------------------------------------------
 
-#list of US states for hospital content page
-ho_states = ho_df["State"].dropna().unique()
+#function to return the positions of the k highest (or lowest if ascending) values, in rank order, without sorting every value.
+#values tied with the k-th value are ranked by tie_keys in ascending order (e.g. CCN), so the same inputs always return the same rows.
+#missing values are never ranked
+def select_top_k(values, k, ascending = False, tie_keys = None):
+    
+    values = np.asarray(values, dtype = "float64")
+    tie_keys = np.arange(len(values)) if tie_keys is None else np.asarray(tie_keys)
+    if tie_keys.dtype == object:
+        tie_keys = tie_keys.astype(str)
+    
+    #rank on the negated values when looking for the highest values so that lower rank keys are always better
+    valid_pos = np.flatnonzero(~np.isnan(values))
+    rank_keys = values[valid_pos] if ascending else -values[valid_pos]
+    
+    #partially partition the values to find the k-th best value, and keep every value at least as good as it (including ties)
+    if k < len(rank_keys):
+        kth_key = np.partition(rank_keys, k - 1)[k - 1]
+        keep = rank_keys <= kth_key
+        valid_pos, rank_keys = valid_pos[keep], rank_keys[keep]
+    
+    #only the kept values (k plus any ties) are sorted
+    order = np.lexsort((tie_keys[valid_pos], rank_keys))
+    
+    return valid_pos[order][:k]
 
-#list of hospital measure names
-ho_measures = ho_df["Payment Measure Name"].dropna().str.replace("Payment for ", "").str.replace("patients", "").str.strip().unique()
-ho_measures = [msr.title() + " Measure" for msr in ho_measures]
- 
-#list of value categories
-ho_val_cat = ho_df["Value of Care Category"].dropna().unique()
-#list of payment categories
-ho_pmt_cat = ho_df["Payment Category"].dropna().unique()
+#function to map each group of a dataset to its (first row, last row + 1) position. the dataset must already be sorted by the grouping columns
+def build_slice_index(df, group_cols):
+    
+    return {key: (pos[0], pos[-1] + 1) for key, pos in df.groupby(group_cols, observed = True, sort = False).indices.items()}
 
-#list of possible news category
-news_categories = ["Business", "Entertainment", "General", "Health", "Science", "Sports", "Technology"]
+#function to map each (measure, start year) and (measure, start year, state) group of the hospice dataset to its (first row, last row + 1) position.
+#the dataset must already be sorted by measure, start year and state so that each group is a contiguous block of rows
+def build_hs_index(df):
+    
+    msr_yr_index = {(msr, int(yr)): row_slice for (msr, yr), row_slice in build_slice_index(df, ["Measure Name", "Start Year"]).items()}
+    msr_yr_st_index = {(msr, int(yr), st): row_slice for (msr, yr, st), row_slice in build_slice_index(df, ["Measure Name", "Start Year", "State"]).items()}
+    
+    return msr_yr_index, msr_yr_st_index
 
-#list of possible news outlets
-apikey = "2cab0d8e7b89467e9a953f33281425b5"
-#apikey = "da8e2e705b914f9f86ed2e9692e66012"
-newsapi = NewsApiClient(api_key = apikey)
-news_sources = newsapi.get_sources()
-news_outlets = [(i["id"], i["name"]) for i in news_sources["sources"]]
+#function to return the rows of the hospice dataset for a given measure, range of start years and state (or All states) without scanning the full dataset
+def get_hs_rows(measure, year_range, state = "All"):
+    
+    if state == "All":
+        row_slices = [hs_msr_yr_index.get((measure, yr)) for yr in range(year_range[0], year_range[1] + 1)]
+    else:
+        row_slices = [hs_msr_yr_st_index.get((measure, yr, state)) for yr in range(year_range[0], year_range[1] + 1)]
+    row_slices = [row_slice for row_slice in row_slices if row_slice is not None]
+    
+    if len(row_slices) == 0:
+        return hs_df.iloc[0:0]
+    
+    #consecutive years of the same measure sit next to each other, so a national query is a single block of rows
+    if all(row_slices[i][1] == row_slices[i+1][0] for i in range(len(row_slices) - 1)):
+        return hs_df.iloc[row_slices[0][0]:row_slices[-1][1]]
+    
+    return hs_df.iloc[np.concatenate([np.arange(start, stop) for start, stop in row_slices])]
 
-#******************************************************************************
-#SECTION III: CLEAN/PROCESS INPUT FILES AND SUMMARY STATISTICS
-#******************************************************************************
+#function to return the CCN, name and score of the k highest and k lowest scoring rows of the hospice dataset for a given measure, range of start years
+#and state (or All states). ties are ranked by CCN, and the lowest scoring rows are listed from highest to lowest score
+def get_hs_ranks(state, measure, year_range, k):
+    
+    #remove records where score is not available from consideration
+    scored_df = get_hs_rows(measure, year_range, state).dropna(subset = ["Score"]).rename(columns = {"CMS Certification Number (CCN)": "CCN"})
+    
+    top_rank = scored_df.iloc[select_top_k(scored_df["Score"], k, tie_keys = scored_df["CCN"])][["CCN", "Facility Name", "Score"]]
+    bottom_rank = scored_df.iloc[select_top_k(scored_df["Score"], k, ascending = True, tie_keys = scored_df["CCN"])[::-1]][["CCN", "Facility Name", "Score"]]
+    
+    return top_rank, bottom_rank
 
-hha_summ_df_st = hha_df.groupby("State").aggregate({"CMS Certification Number (CCN)": "nunique", #total number of unique hha provider by state
-                                                    "Quality of patient care star rating": "mean", #average patient star rating by state
-                                                    "How much Medicare spends on an episode of care at this agency, compared to Medicare spending across all agencies nationally": "mean"}).reset_index()
-#rename columns
-hha_summ_df_st = hha_summ_df_st.rename(columns = {"CMS Certification Number (CCN)": "Total Number of Providers", 
-                                                  "Quality of patient care star rating": "Quality of Patient Care",
-                                                  "How much Medicare spends on an episode of care at this agency, compared to Medicare spending across all agencies nationally": "Medicare Spending per Episode per Provider"})
-#round results
-hha_summ_df_st["Quality of Patient Care"] = round(hha_summ_df_st["Quality of Patient Care"], 2)
-hha_summ_df_st["Medicare Spending per Episode per Provider"] = round(hha_summ_df_st["Medicare Spending per Episode per Provider"], 2)
-
-#loop through each column and calculate the percentage of providers in each state with Offers... equal to Yes
-for off_val in offer_metric_lst:
-    hha_df[off_val] = hha_df[off_val].map({"Yes": 1, "No": 0})
-    inter_hha = hha_df.groupby("State").aggregate({off_val: "sum", "CMS Certification Number (CCN)": "nunique"}).reset_index()
-    inter_hha["% of Providers Offering" + off_val.replace("Offers", "")] = round(inter_hha[off_val]/inter_hha["CMS Certification Number (CCN)"]*100, 1)
-    if off_val == offer_metric_lst[0]:
-        fin_offsumm_df = inter_hha[["State", "% of Providers Offering" + off_val.replace("Offers", "")]]
-    else:
-        fin_offsumm_df = pd.merge(fin_offsumm_df, inter_hha[["State", "% of Providers Offering" + off_val.replace("Offers", "")]], on = "State")
+#------------------------------------------------------------------------------
+
+#function to precompute the count, sum, mean and median score for each state (and the nation), measure and start year for the state vs. national bar chart
+def build_hs_stats_cube(df):
+    
+    scored_df = df.dropna(subset = ["Score"]).astype({"Score": "float64"})
+    
+    st_stats = scored_df.groupby(["State", "Measure Name", "Start Year"], observed = True)["Score"].agg(["count", "sum", "mean", "median"]).reset_index()
+    nat_stats = scored_df.groupby(["Measure Name", "Start Year"], observed = True)["Score"].agg(["count", "sum", "mean", "median"]).reset_index()
+    nat_stats["State"] = "National"
+    
+    stats_df = pd.concat([st_stats.astype({"State": str, "Measure Name": str}), nat_stats.astype({"Measure Name": str})], ignore_index = True)
+    stats_df = stats_df.sort_values(by = ["State", "Measure Name", "Start Year"]).reset_index(drop = True)
+    
+    return stats_df, build_slice_index(stats_df, ["State", "Measure Name"])
+
+#function to precompute the number of CCNs and the median score for each county by state (and nationally) and measure, over each run of consecutive start years for the county bar chart.
+#medians cannot be combined across years, so every run of years that the study period slider can select is computed separately. the number of runs grows with
+#the square of the number of years, so each run is aggregated on integer county numbers rather than grouping the text columns again
+def build_hs_county_cube(df, data_years):
+    
+    scored_df = df.dropna(subset = ["Score"]).astype({"Score": "float64"})
+    
+    #number each county by state and measure and nationally by measure, in the order of the cube (by state, measure and county name)
+    st_grouped = scored_df.groupby(["State", "Measure Name", "County Name"], observed = True)
+    nat_grouped = scored_df.groupby(["Measure Name", "County Name"], observed = True)
+    county_labels = pd.concat([st_grouped.size().index.to_frame(index = False).astype(str),
+                               nat_grouped.size().index.to_frame(index = False).astype(str).assign(State = "National")], ignore_index = True)
+    county_order = county_labels.sort_values(by = ["State", "Measure Name", "County Name"]).index.to_numpy()
+    county_rank = np.empty(len(county_order), dtype = "int64")
+    county_rank[county_order] = np.arange(len(county_order))
+    county_labels = county_labels.iloc[county_order].reset_index(drop = True)
+    
+    #every scored row counts towards its county by state and nationally. rows missing a state or county are left out, as by groupby
+    st_keys = st_grouped.ngroup().to_numpy()
+    nat_keys = nat_grouped.ngroup().to_numpy() + st_grouped.ngroups
+    rows = np.concatenate([np.flatnonzero(~np.isnan(st_keys)), np.flatnonzero(~np.isnan(nat_keys))])
+    keys = county_rank[np.concatenate([st_keys[~np.isnan(st_keys)], nat_keys[~np.isnan(nat_keys)]]).astype("int64")]
+    ccn_codes = scored_df["CMS Certification Number (CCN)"].cat.codes.to_numpy().astype("int64")[rows]
+    scores = scored_df["Score"].to_numpy()[rows]
+    start_years = scored_df["Start Year"].to_numpy()[rows]
+    nccns = len(scored_df["CMS Certification Number (CCN)"].cat.categories)
+    
+    yrs_runs = [tuple(data_years[i:i+nyrs]) for nyrs in range(1, len(data_years) + 1) for i in range(len(data_years) - nyrs + 1)]
+    run_lst, key_lst, ccn_lst, score_lst = [], [], [], []
+    for run_ind, yrs in enumerate(yrs_runs):
+        in_run = (start_years >= yrs[0]) & (start_years <= yrs[-1])
+        run_keys = keys[in_run]
         
-#merge results together
-hha_summ_df_st = pd.merge(hha_summ_df_st, fin_offsumm_df, on = "State")
+        #median score of each county (in county order), and number of distinct CCNs counted from the distinct (county, CCN) pairs
+        medians = pd.Series(scores[in_run]).groupby(run_keys).median()
+        ccn_counts = np.bincount(np.unique(run_keys*nccns + ccn_codes[in_run])//nccns, minlength = len(county_labels))
+        
+        run_lst.append(np.full(len(medians), run_ind))
+        key_lst.append(medians.index.to_numpy())
+        ccn_lst.append(ccn_counts[medians.index.to_numpy()])
+        score_lst.append(medians.to_numpy())
+    
+    #the rows are sorted by run, state, measure and county, so each (state, measure, run of years) is a contiguous block of rows
+    key_arr = np.concatenate(key_lst)
+    county_df = pd.DataFrame({"County Name": county_labels["County Name"].to_numpy()[key_arr], "CCN": np.concatenate(ccn_lst), "Score": np.concatenate(score_lst)})
+    block_df = pd.DataFrame({"Run": np.concatenate(run_lst), "Block": county_labels.groupby(["State", "Measure Name"], sort = False).ngroup().to_numpy()[key_arr]})
+    block_labels = county_labels.drop_duplicates(subset = ["State", "Measure Name"])
+    block_labels = list(zip(block_labels["State"], block_labels["Measure Name"]))
+    county_index = {(*block_labels[block], yrs_runs[run_ind]): row_slice for (run_ind, block), row_slice in build_slice_index(block_df, ["Run", "Block"]).items()}
+    
+    return county_df, county_index
+
+#function to look up the precomputed mean or median score by start year for a state (or National) and measure
+def get_hs_stats(state, measure, year_range, avg_type):
+    
+    start, stop = hs_stats_index.get((state, measure), (0, 0))
+    stats_df = hs_stats_df.iloc[start:stop]
+    stats_df = stats_df[stats_df["Start Year"].between(year_range[0], year_range[1])]
+    
+    return stats_df[["Start Year", avg_type.lower()]].rename(columns = {avg_type.lower(): "Score"})
+
+#function to look up the precomputed number of CCNs and median score by county for a state (or National), measure and range of start years
+def get_hs_county_stats(state, measure, year_range):
+    
+    yrs = tuple(yr for yr in hs_data_years if year_range[0] <= yr <= year_range[1])
+    start, stop = hs_county_index.get((state, measure, yrs), (0, 0))
+    
+    return hs_county_df.iloc[start:stop]
+
+#------------------------------------------------------------------------------
+
+#function to precompute the number of distinct hospitals and the sum and count of available payments by measure, state, city, value of care category and payment category.
+#CMS reports one row per hospital and measure, so the distinct hospital counts can be added up across cities and categories when rolling up the cube
+def build_ho_cube(df):
+    
+    return df.groupby(["Payment Measure", "State", "City", "Value of Care Category", "Payment Category"], observed = True, dropna = False).aggregate(**{"Facilities": ("Facility ID", "nunique"),
+                                                                                                                                                     "Payment Sum": ("Payment", "sum"),
+                                                                                                                                                     "Payment Count": ("Payment", "count")}).reset_index()
+
+#function to roll the hospital cube up to the given columns
+def rollup_ho_cube(cube_df, group_cols):
+    
+    return cube_df.groupby(group_cols, observed = True, dropna = False)[["Facilities", "Payment Sum", "Payment Count"]].sum().reset_index()
+
+#function to build the view of the hospital cube shown for each measure and state option: by state for All states (national roll-up) and by city for a single state.
+#the views are sorted by measure and state option and indexed by the position of each view
+def build_ho_views(cube_df):
+    
+    nat_view = rollup_ho_cube(cube_df, ["Payment Measure", "State", "Value of Care Category", "Payment Category"]).rename(columns = {"State": "Geo"})
+    nat_view["View"] = "All"
+    st_view = cube_df.rename(columns = {"State": "View", "City": "Geo"})
+    
+    view_df = pd.concat([nat_view.astype({"Payment Measure": str}), st_view.astype({"Payment Measure": str})], ignore_index = True)
+    view_df = view_df.sort_values(by = ["Payment Measure", "View"], kind = "stable").reset_index(drop = True)
+    
+    return view_df, build_slice_index(view_df, ["Payment Measure", "View"])
+
+#function to return the view of the hospital cube for a given measure and state (or All states)
+def get_ho_view(measure, state = "All"):
+    
+    start, stop = ho_view_index.get((measure, state), (0, 0))
+    
+    return ho_view_df.iloc[start:stop]
+
+#------------------------------------------------------------------------------
+
+#home health variables behind the choropleth metrics that show the providers with the highest and lowest value in a state
+hha_extreme_metrics = {"Quality of Patient Care": "Quality of patient care star rating",
+                       "Medicare Spending per Episode per Provider": "How much Medicare spends on an episode of care at this agency, compared to Medicare spending across all agencies nationally"}
+
+#function to return the (position, value) of the row with the highest (or lowest if ascending) value. ties go to the lowest tie key (e.g. first state in alphabetical order)
+def get_extreme_row(values, tie_keys, ascending = False):
+    
+    pos = select_top_k(values, 1, ascending = ascending, tie_keys = tie_keys)
+    
+    return (pos[0], values.iloc[pos[0]]) if len(pos) > 0 else (None, np.nan)
+
+#function to return the (provider name, CCN, value) of the provider with the highest (or lowest if ascending) value of a variable. ties go to the lowest CCN
+def get_provider_extreme(df, varname, ascending = False):
+    
+    pos, val = get_extreme_row(df[varname], df["CMS Certification Number (CCN)"], ascending)
+    if pos is None:
+        return None
+    
+    return df["Provider Name"].iloc[pos], df["CMS Certification Number (CCN)"].iloc[pos], val
+
+#function to return a list of (category, number of providers) ordered from the most to the least common category. ties are ordered by category name
+def get_category_counts(values):
+    
+    counts = values.value_counts()
+    order = np.lexsort((counts.index.astype(str), -counts.to_numpy()))
+    
+    return [(counts.index[i], int(counts.iloc[i])) for i in order]
+
+#function to precompute the summary shown in the boxes next to the choropleth map for each state option:
+#"All" maps each choropleth metric to the (state, value) with the highest and lowest value across states.
+#each state maps the ownership type and each offered service to its provider counts, and each variable in hha_extreme_metrics to the provider with the highest and lowest value
+def build_hha_state_summary(df, summ_df):
+    
+    state_summary = {"All": {}}
+    for metric in summ_df.columns.drop("State"):
+        max_pos, max_val = get_extreme_row(summ_df[metric], summ_df["State"])
+        min_pos, min_val = get_extreme_row(summ_df[metric], summ_df["State"], ascending = True)
+        state_summary["All"][metric] = {"max": (summ_df["State"].iloc[max_pos], max_val),
+                                        "min": (summ_df["State"].iloc[min_pos], min_val)}
+    
+    for state, state_df in df.groupby("State"):
+        state_summary[state] = {"Type of Ownership": get_category_counts(state_df["Type of Ownership"])}
+        for off_val in offer_metric_lst:
+            state_summary[state][off_val] = get_category_counts(state_df[off_val].map({1: "Yes", 0: "No"}))
+        for varname in hha_extreme_metrics.values():
+            state_summary[state][varname] = {"max": get_provider_extreme(state_df, varname),
+                                             "min": get_provider_extreme(state_df, varname, ascending = True)}
+    
+    return state_summary
+
+#------------------------------------------------------------------------------
+
+#set MEDICARE_QUERY_BACKEND=duckdb to run the hospice and hospital queries on an embedded DuckDB database instead of pandas. the hospice and hospital datasets
+#are copied into DuckDB's columnar tables, the hospice statistics and the hospital cube are aggregated there, and the top and bottom ranking hospices
+#are queried there for each request. DuckDB runs each query vectorized and in parallel on MEDICARE_QUERY_THREADS threads (every CPU by default). the results
+#are the same as with pandas (see --parity in benchmarks/bench_callbacks.py). pandas is used if duckdb is not installed
+query_backend = os.environ.get("MEDICARE_QUERY_BACKEND", "pandas")
+query_threads = int(os.environ.get("MEDICARE_QUERY_THREADS", 0))
+
+if query_backend == "duckdb" and duckdb is None:
+    print("duckdb is not installed, running the queries on pandas")
+    query_backend = "pandas"
+
+#function to return a DuckDB database holding a copy of the hospice and hospital datasets as the hs and ho tables. the hospice dataset is copied in its
+#sorted order, so that DuckDB skips the blocks of rows outside the measure and start years of a query
+def connect_query_backend(hs_df, ho_df):
+    
+    con = duckdb.connect(config = {"threads": query_threads} if query_threads > 0 else {})
+    for table, df in [("hs", hs_df), ("ho", ho_df)]:
+        con.register("input_df", df)
+        con.execute("CREATE TABLE {0} AS SELECT * FROM input_df".format(table))
+        con.unregister("input_df")
+    
+    return con
+
+#function to precompute the count, sum, mean and median score for each state (and the nation), measure and start year with DuckDB (see build_hs_stats_cube)
+def build_hs_stats_cube_sql(con):
+    
+    stats_df = con.execute("""WITH scored AS (SELECT CAST("State" AS VARCHAR) AS "State", CAST("Measure Name" AS VARCHAR) AS "Measure Name",
+                                                      CAST("Start Year" AS BIGINT) AS "Start Year", CAST("Score" AS DOUBLE) AS "Score"
+                                               FROM hs WHERE "Measure Name" IS NOT NULL AND "Score" IS NOT NULL AND NOT isnan("Score"))
+                              SELECT "State", "Measure Name", "Start Year", count(*) AS "count", sum("Score") AS "sum", avg("Score") AS "mean", median("Score") AS "median"
+                              FROM scored WHERE "State" IS NOT NULL GROUP BY ALL
+                              UNION ALL
+                              SELECT 'National', "Measure Name", "Start Year", count(*), sum("Score"), avg("Score"), median("Score")
+                              FROM scored GROUP BY ALL
+                              ORDER BY "State", "Measure Name", "Start Year" """).df()
+    
+    return stats_df, build_slice_index(stats_df, ["State", "Measure Name"])
+
+#function to precompute the number of distinct hospitals and the sum and count of available payments by measure, state, city, value of care category
+#and payment category with DuckDB (see build_ho_cube)
+def build_ho_cube_sql(con):
+    
+    return con.execute("""SELECT "Payment Measure", "State", "City", "Value of Care Category", "Payment Category", count(DISTINCT "Facility ID") AS "Facilities",
+                                 coalesce(sum("Payment"), 0) AS "Payment Sum", count("Payment") AS "Payment Count"
+                          FROM ho GROUP BY ALL ORDER BY ALL""").df()
+
+#function to query the k highest and k lowest scoring rows of the hospice dataset with DuckDB (see get_hs_ranks). each request runs its queries on its own cursor
+def query_hs_ranks(state, measure, year_range, k):
+    
+    where_sql = '"Measure Name" = ? AND "Start Year" BETWEEN ? AND ? AND "Score" IS NOT NULL AND NOT isnan("Score")'
+    params = [measure, year_range[0], year_range[1]]
+    if state != "All":
+        where_sql += ' AND "State" = ?'
+        params.append(state)
+    
+    cursor = query_con.cursor()
+    try:
+        rank_lst = [cursor.execute("""SELECT CAST("CMS Certification Number (CCN)" AS VARCHAR) AS "CCN", CAST("Facility Name" AS VARCHAR) AS "Facility Name", "Score"
+                                      FROM hs WHERE {0} ORDER BY "Score" {1}, "CCN" LIMIT ?""".format(where_sql, order), params + [k]).df() for order in ["DESC", "ASC"]]
+    finally:
+        cursor.close()
+    
+    return rank_lst[0], rank_lst[1].iloc[::-1]
+
+#------------------------------------------------------------------------------
+
+#function to build the dropdown menu options, summary statistics and lookup tables of the input datasets, by variable name. the dashboard reads them
+#as global variables, which are all replaced at once when a new release of the input files is loaded (see reload_data in SECTION V)
+def build_data_snapshot(hha_df, hs_df, ho_df):
+    
+    snapshot = build_data_options(hha_df, hs_df, ho_df)
+    
+    snapshot["hha_df"] = hha_df
+    snapshot["hha_summ_df_st"] = build_hha_summary(hha_df)
+    snapshot["hh_hist_edges"], snapshot["hh_hist_cube"] = build_hh_hist_cube(hha_df)
+    snapshot["hha_state_summary"] = build_hha_state_summary(hha_df, snapshot["hha_summ_df_st"])
+    
+    #sort the hospice dataset by measure, start year and state and index the position of each group, so that a query only reads the rows of the start years
+    #in its study period however many releases are read in
+    hs_df = hs_df.sort_values(by = ["Measure Name", "Start Year", "State"], kind = "stable").reset_index(drop = True)
+    snapshot["hs_df"] = hs_df
+    snapshot["hs_msr_yr_index"], snapshot["hs_msr_yr_st_index"] = build_hs_index(hs_df)
+    
+    #embedded database queried instead of pandas (None if the queries run on pandas)
+    query_con = connect_query_backend(hs_df, ho_df) if query_backend == "duckdb" else None
+    snapshot["query_con"] = query_con
+    
+    #list of start years found in the hospice dataset
+    snapshot["hs_data_years"] = sorted(int(yr) for yr in hs_df["Start Year"].unique())
+    snapshot["hs_stats_df"], snapshot["hs_stats_index"] = build_hs_stats_cube(hs_df) if query_con is None else build_hs_stats_cube_sql(query_con)
+    snapshot["hs_county_df"], snapshot["hs_county_index"] = build_hs_county_cube(hs_df, snapshot["hs_data_years"])
+    
+    snapshot["ho_df"] = ho_df
+    snapshot["ho_cube_df"] = build_ho_cube(ho_df) if query_con is None else build_ho_cube_sql(query_con)
+    snapshot["ho_view_df"], snapshot["ho_view_index"] = build_ho_views(snapshot["ho_cube_df"])
+    
+    return snapshot
+
+globals().update(build_data_snapshot(hha_df, hs_df, ho_df))
+
+end_startup_phase("summary statistics")
+
+#------------------------------------------------------------------------------
+
+#set MEDICARE_SHARED_DATA=1 to publish the cleaned datasets and the aggregates built from them as memory-mapped NumPy files in MEDICARE_SHARED_DIR,
+#and serve them from the mapped files. every process serving the dashboard maps the same read-only files, so their pages are shared through the OS page
+#cache rather than copied into each worker (e.g. gunicorn --preload workers, whose pandas objects would otherwise be copied on write after fork)
+shared_data_enabled = os.environ.get("MEDICARE_SHARED_DATA", "0") == "1"
+shared_dir = os.environ.get("MEDICARE_SHARED_DIR", os.path.join(cache_dir, "shared"))
+
+#datasets and aggregates published to the shared files
+shared_frame_names = ["hha_df", "hs_df", "ho_df", "hs_stats_df", "hs_county_df", "ho_cube_df", "ho_view_df"]
+
+#function to return the folder of the shared files for the given input files and the version of this file
+def get_shared_path(filepaths):
+    
+    shared_key = hashlib.sha256()
+    for filepath in filepaths:
+        source_stat = os.stat(get_source_path(filepath))
+        shared_key.update("{0}:{1}:{2};".format(filepath, source_stat.st_size, source_stat.st_mtime_ns).encode("utf-8"))
+    with open(os.path.abspath(__file__), "rb") as code_file:
+        shared_key.update(code_file.read())
+    
+    return os.path.join(shared_dir, shared_key.hexdigest()[:16])
+
+#function to save each column of a dataset as a NumPy file. categorical and text columns are saved as integer codes, with their categories in meta.json
+def write_shared_frame(df, frame_dir):
+    
+    os.makedirs(frame_dir)
+    columns = []
+    for col_ind, col in enumerate(df.columns):
+        col_meta = {"name": col}
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            col_meta["categories"] = values.cat.categories.tolist()
+            values = values.cat.codes
+        elif values.dtype.kind not in "biuf":
+            #text columns are stored as categorical codes too, in the smallest integer type that holds them so that mapping them does not copy them.
+            #the categories are sorted so that grouping on the mapped column orders the groups as grouping on the text did
+            codes, uniques = pd.factorize(values, sort = True)
+            col_meta["categories"] = uniques.tolist()
+            values = pd.Categorical.from_codes(codes, categories = uniques).codes
+        np.save(os.path.join(frame_dir, "{0}.npy".format(col_ind)), np.asarray(values))
+        columns.append(col_meta)
+    
+    with open(os.path.join(frame_dir, "meta.json"), "w") as meta_file:
+        json.dump(columns, meta_file)
+
+#function to return a dataset backed by its memory-mapped NumPy files. every column stays in the mapped (read-only) files: text columns are mapped
+#as categoricals over their codes, so each process only holds their (small) lists of distinct values
+def map_shared_frame(frame_dir):
+    
+    with open(os.path.join(frame_dir, "meta.json")) as meta_file:
+        columns = json.load(meta_file)
+    
+    col_dict = {}
+    for col_ind, col_meta in enumerate(columns):
+        values = np.load(os.path.join(frame_dir, "{0}.npy".format(col_ind)), mmap_mode = "r")
+        if "categories" in col_meta:
+            values = pd.Categorical.from_codes(values, categories = col_meta["categories"])
+        col_dict[col_meta["name"]] = values
+    
+    return pd.DataFrame(col_dict, copy = False)
+
+#function to publish the given datasets (by variable name) built from the given input files if they are not published yet (the first process to finish wins),
+#and to return the mapped copy of each dataset
+def publish_shared_frames(frames, filepaths):
+    
+    shared_path = get_shared_path(filepaths)
+    if not os.path.isdir(shared_path):
+        tmp_path = "{0}.{1}.tmp".format(shared_path, os.getpid())
+        for name, df in frames.items():
+            write_shared_frame(df.reset_index(drop = True), os.path.join(tmp_path, name))
+        try:
+            os.rename(tmp_path, shared_path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors = True)
+    
+    return {name: map_shared_frame(os.path.join(shared_path, name)) for name in frames}
+
+if shared_data_enabled:
+    globals().update(publish_shared_frames({name: globals()[name] for name in shared_frame_names}, [hha_filepath] + hs_filepaths + [ho_filepath]))
+    end_startup_phase("shared data")
 
 #******************************************************************************
 #SECTION IV: DEFINE DASHBOARD
 #******************************************************************************
 
-#initialize dash application
-app = dash.Dash(__name__, external_stylesheets = [dbc.themes.DARKLY])
+#initialize dash application. the content pages are built on first navigation, so their components are not in the initial layout
+app = dash.Dash(__name__, external_stylesheets = [dbc.themes.DARKLY], suppress_callback_exceptions = True)
 
 #define sidebar
 sidebar = html.Div(style = {"position": "fixed",
@@ -270,8 +1184,10 @@ sidebar = html.Div(style = {"position": "fixed",
 
 content_style = {"margin-left": "27rem", "margin-right": "2rem", "padding": "2rem 1rem"
                  }                            
-#page content for home health
-hh_page = html.Div(style = content_style,
+#function to build the page content for home health
+def build_hh_page():
+    
+    return html.Div(style = content_style,
                    children = [
                         
                         dbc.Card(children = [
@@ -282,7 +1198,7 @@ hh_page = html.Div(style = content_style,
                                                 #dropdown menu for choropleth metrics
                                                 dbc.DropdownMenu(color = "danger",
                                                                  label = "Summary Metric",
-                                                                 children = [dbc.DropdownMenuItem(id = "choro_metric"+str(mt_ind), children = mt_val, n_clicks = 0) for mt_ind, mt_val in enumerate(choro_metrics)]),
+                                                                 children = [dbc.DropdownMenuItem(id = {"type": "choro_metric", "index": mt_val}, children = mt_val, n_clicks = 0) for mt_val in choro_metrics]),
                                                 
                                                 #dropdown menu for U.S states
                                                 dbc.DropdownMenu(color = "danger",
@@ -290,10 +1206,10 @@ hh_page = html.Div(style = content_style,
                                                                  children = [
                                                                               dbc.Row(style = {"width": "500px"},
                                                                                       children = [dbc.Col(width = {"size": 2, "order": 1},
-                                                                                                          children = [dbc.DropdownMenuItem(id = "choro_stateall", children = "All", n_clicks = 0)])] +
+                                                                                                          children = [dbc.DropdownMenuItem(id = {"type": "choro_state", "index": "All"}, children = "All", n_clicks = 0)])] +
                                                                                       
                                                                                                  [dbc.Col(width = {"size": 2, "order": i+2}, 
-                                                                                                          children = [dbc.DropdownMenuItem(id = "choro_state"+st_val, children = st_val, n_clicks = 0)
+                                                                                                          children = [dbc.DropdownMenuItem(id = {"type": "choro_state", "index": st_val}, children = st_val, n_clicks = 0)
                                                                                                           for st_val in hha_choro_states[nstates_per_col*i:nstates_per_col*(i+1)]])
                                                                                                   for i in range(ncol_for_states + (len_states%ncol_for_states))])
                                                                          
@@ -375,7 +1291,7 @@ hh_page = html.Div(style = content_style,
                                                                                                                                                     ]),
                                                                                                                                         
                                                                                                                                  dbc.Col(width = {"size": 8, "order": 2, "offset": 1},
-                                                                                                                                         children = [dcc.Graph(id = "hh_histplot")]),
+                                                                                                                                         children = [dcc.Graph(id = "hh_histplot"), dcc.Store(id = "hh_histplot_update")]),
                                                                                                                                          
                                                                                                                      
                                                                                                                                 ])
@@ -410,8 +1326,10 @@ hh_page = html.Div(style = content_style,
     
     
     
-#page content for hospice
-hs_page = html.Div(style = content_style, 
+#function to build the page content for hospice
+def build_hs_page():
+    
+    return html.Div(style = content_style, 
                    children = [
                            
                                dbc.Row(children = [
@@ -500,7 +1418,7 @@ hs_page = html.Div(style = content_style,
                                                                                                                           inline = True,
                                                                                                                           options = [{"label": "Mean", "value": "Mean"},
                                                                                                                                      {"label": "Median", "value": "Median"}])),
-                                                                                            dbc.CardBody(children = [dcc.Graph(id = "hs_msr_comp_bar")])])]),
+                                                                                            dbc.CardBody(children = [dcc.Graph(id = "hs_msr_comp_bar"), dcc.Store(id = "hs_msr_comp_bar_update")])])]),
                                                    
                                                    #bar graph comparing the median score among the top/bottom 5 ranking county
                                                    dbc.Col(width = {"size": 6, "order": 2},
@@ -510,7 +1428,7 @@ hs_page = html.Div(style = content_style,
                                                                                                                           options = [{"label": "Top 5", "value": "Top 5"},
                                                                                                                                      {"label": "Bottom 5", "value": "Bottom 5"}])),
     
-                                                                                            dbc.CardBody(children = [dcc.Graph(id = "hs_reg_comp_bar")])])])
+                                                                                            dbc.CardBody(children = [dcc.Graph(id = "hs_reg_comp_bar"), dcc.Store(id = "hs_reg_comp_bar_update")])])])
                                        
                                                   ])
                            
@@ -519,8 +1437,10 @@ hs_page = html.Div(style = content_style,
     
     
     
-#content page for hospitals
-ho_page = html.Div(style = content_style,
+#function to build the content page for hospitals
+def build_ho_page():
+    
+    return html.Div(style = content_style,
                    children = [
                                dbc.Row(children = [
                                                   dbc.Col(children = [dbc.Card(children = [
@@ -528,8 +1448,8 @@ ho_page = html.Div(style = content_style,
                                                                                           dbc.CardHeader(style = {"backgroundColor": danger_color},
                                                                                                          children = [dbc.Select(id = "news_outlet_sl",
                                                                                                                                 style = {"display": "inline-block", "color": "black", "width": "200px", "font-size": "12px"},
-                                                                                                                                options = [{"label": out_opt[1], "value": out_opt[0]} for out_opt in news_outlets],
-                                                                                                                                value = news_outlets[0][0])
+                                                                                                                                options = [{"label": out_opt[1], "value": out_opt[0]} for out_opt in get_news_outlets()],
+                                                                                                                                value = get_news_outlets()[0][0])
                                                                                                                      ]),
     
                                                                                           #output of top 5 most recent health related stories in the respective news outlet                                                  
@@ -543,6 +1463,7 @@ ho_page = html.Div(style = content_style,
                                                                                           #create input for news topic of interest
                                                                                           dbc.CardHeader(style = {"backgroundColor": danger_color},
                                                                                                          children = [dbc.Input(id = "news_topic_inp",
+                                                                                                                               debounce = True, #search once the topic is entered rather than on every keystroke
                                                                                                                                style = {"display": "inline-block", "width": "300px", "font-size": "12px"},
                                                                                                                                bs_size = "md",
                                                                                                                                placeholder = "Enter a news topic to search for."),
@@ -595,9 +1516,9 @@ ho_page = html.Div(style = content_style,
                                                                                          dbc.CardBody(children = [
                                                                                                                  dbc.Row(children = [
                                                                                                                                      #pie chart for hospital value
-                                                                                                                                     dbc.Col(width = {"size": 6, "order": 1}, children = dcc.Graph(id = "ho_value_pie")),
+                                                                                                                                     dbc.Col(width = {"size": 6, "order": 1}, children = [dcc.Graph(id = "ho_value_pie"), dcc.Store(id = "ho_value_pie_update")]),
                                                                                                                                      #pie chart for hospital payment cost                                                                                                                                              
-                                                                                                                                     dbc.Col(width = {"size": 6, "order": 2}, children = dcc.Graph(id = "ho_cost_pie"))
+                                                                                                                                     dbc.Col(width = {"size": 6, "order": 2}, children = [dcc.Graph(id = "ho_cost_pie"), dcc.Store(id = "ho_cost_pie_update")])
                                                                                                                                     ]),
     
                                                                                                                  html.Br(),
@@ -646,6 +1567,90 @@ ho_page = html.Div(style = content_style,
                               ])
 
 
+#store holding the home health summary table and the base choropleth figure. its data is filled in once the figure function is defined (see SECTION V)
+hh_choro_store = dcc.Store(id = "hh_choro_store")
+
+#------------------------------------------------------------------------------
+
+#wrapper around an object that never changes once built (e.g. figure templates, table headers). FastJSONEncoder serializes the object once and reuses
+#its JSON afterwards, while the plotly encoder serializes the wrapped object as usual
+class StaticJSON:
+    
+    def __init__(self, obj):
+        self.obj = obj
+        self.encoded = None
+    
+    def to_plotly_json(self):
+        return self.obj
+
+#function to return the layout and the default properties of each trace of a figure, to be shipped to the browser once as a figure template
+def build_figure_template(layout, traces):
+    
+    return go.Figure(data = traces, layout = layout).to_plotly_json()
+
+#figure templates shared by every update of a graph. the callbacks of each graph only return the trace data (and layout properties) that change,
+#which are merged into the template in the browser (see SECTION V)
+figure_templates = {
+    
+    #overlay histogram comparing two home health groups
+    "hh_histplot": build_figure_template(go.Layout(barmode = "overlay",
+                                                   margin = dict(l=10, r=5, b=10, t=10),
+                                                   width = 550,
+                                                   height = 325,
+                                                   hoverlabel = {"font": dict(size=8)},
+                                                   paper_bgcolor = dark_color,
+                                                   plot_bgcolor = dark_color,
+                                                   xaxis = {"linecolor": danger_color},
+                                                   yaxis = {"title": "# of Providers", "gridcolor": danger_color},
+                                                   font = {"size": 8},
+                                                   font_color = light_color),
+                                         [go.Bar(marker = {"color": color}, opacity = 0.75, showlegend = False,
+                                                 hovertemplate = "<b>Metric Value:</b> %{x}<br>" +
+                                                                 "<b># of Providers:</b> %{y}") for color in ["#776AC8", "#E8A134"]]),
+    
+    #bar graph comparing the state and national hospice measure score
+    "hs_msr_comp_bar": build_figure_template(go.Layout(paper_bgcolor = dark_color,
+                                                       plot_bgcolor = dark_color,
+                                                       font_color = light_color,
+                                                       bargroupgap = 0.1,
+                                                       bargap = 0.3,
+                                                       legend = dict(orientation = "h", yanchor = "middle", xanchor = "center", y = -0.15, x = 0.5),
+                                                       font = {"size": 8},
+                                                       title = {"font": {"color": danger_color, "size": 12}},
+                                                       xaxis = {"linecolor": danger_color},
+                                                       yaxis = {"gridcolor": danger_color}),
+                                             [go.Bar(marker = {"color": color}, width = 0.3) for color in ["#776AC8", "#E8A134"]]),
+    
+    #bar graph comparing the median hospice score among the top/bottom 5 ranking counties
+    "hs_reg_comp_bar": build_figure_template(go.Layout(paper_bgcolor = dark_color,
+                                                       plot_bgcolor = dark_color,
+                                                       font_color = light_color,
+                                                       bargroupgap = 0.1,
+                                                       bargap = 0.3,
+                                                       font = {"size": 8},
+                                                       title = {"text": "<b>COMPARISON OF MEASURE SCORE FOR TOP/BOTTOM 5 COUNTIES:</b>", 
+                                                                "font":{"color": danger_color, "size": 12}},
+                                                       xaxis = {"linecolor": danger_color},
+                                                       yaxis = {"title": "Median Score", "gridcolor": danger_color}),
+                                             [go.Bar(marker = {"color": "#3E84DF"}, showlegend = False,
+                                                     hovertemplate = "<b># of CCNs:</b> %{customdata}<br>" +
+                                                                     "<b>Median:</b> %{y}<extra></extra>")])}
+
+#hospital pie charts by value care and payment category
+for pie_id, pie_title, pie_colors in [("ho_value_pie", "VALUE CARE", px.colors.sequential.Blues), ("ho_cost_pie", "PAYMENT", px.colors.sequential.Oryel)]:
+    figure_templates[pie_id] = build_figure_template(go.Layout(title = {"text": "<b>% OF HOSPITALS BY " + pie_title + " CATEGORY:</b>", "font": {"size": 12, "color": danger_color}},
+                                                               legend = dict(orientation = "h", yanchor = "middle", xanchor = "center", y = -0.7, x = 0.5),
+                                                               font = {"size": 8, "color": "white"},
+                                                               paper_bgcolor = dark_color,
+                                                               plot_bgcolor = dark_color,
+                                                               margin = dict(l=0)),
+                                                     [go.Pie(hole = 0.5,
+                                                             marker = dict(colors = pie_colors),
+                                                             hoverlabel = {"font": {"size": 10}},
+                                                             hovertemplate = "%{label}:<br>" +
+                                                                             "# of Hospitals: %{value:,}<br>" +
+                                                                             "% of Hospitals: %{percent}" +
+                                                                             "<extra></extra>")])
     
 app.layout = html.Div(children = [
         
@@ -653,21 +1658,867 @@ app.layout = html.Div(children = [
                         sidebar,
                         html.Div(id = "page_content"),
                         
-                        #empty container to hold selected input values to be passed into callbacks later on
-                        html.Div(id = "hh_chorometric_input", hidden = True),
-                        html.Div(id = "hh_chorostate_input", hidden = True)
+                        #store holding the selected choropleth metric and state to be passed into callbacks later on
+                        dcc.Store(id = "hh_choro_selection"),
+                        hh_choro_store,
+                        dcc.Store(id = "figure_templates", data = StaticJSON(figure_templates))
         
                                  ]) #end of app.layout
 
+#functions building each content page, and the pages built so far. each page is built on first navigation (see return_content_page)
+content_page_builders = {"ho": build_ho_page, "hh": build_hh_page, "hs": build_hs_page}
+content_pages = {}
+
+#function to return a content page, building it the first time it is shown
+def get_content_page(page_name):
+    
+    page = content_pages.get(page_name)
+    if page is None:
+        page = content_pages[page_name] = content_page_builders[page_name]()
+    
+    return page
+
+end_startup_phase("dashboard layout")
+
 
 #******************************************************************************
 #SECTION V: DEFINE CALLBACKS
 #******************************************************************************
 
+#------------------------------------------------------------------------------
+#CACHE OF CALLBACK RESULTS
+#------------------------------------------------------------------------------
+
+#maximum number of results and maximum total size of the results (in bytes of serialized JSON, as estimated by estimate_json_size) kept for each cached callback
+cache_max_entries = int(os.environ.get("MEDICARE_CACHE_ENTRIES", 512))
+cache_max_bytes = int(os.environ.get("MEDICARE_CACHE_BYTES", 64 * 1024 * 1024))
+
+#version of the loaded input data. results computed from an older version of the data are never returned
+data_version = 0
+
+#result cache of each cached callback by callback name
+callback_caches = {}
+
+#undecorated function of each cached callback by callback name, used to precompute results
+callback_funcs = {}
+
+#least recently used cache holding the results of a callback by its input values
+class CallbackCache:
+    
+    def __init__(self, name, max_entries, max_bytes):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+    
+    #return (True, result) if the key is cached and (False, None) otherwise
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, self.entries[key][0]
+            self.misses += 1
+            return False, None
+    
+    #add a result to the cache, evicting the least recently used results until the cache is back under its limits
+    def put(self, key, result, nbytes):
+        if nbytes > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.nbytes -= self.entries.pop(key)[1]
+            self.entries[key] = (result, nbytes)
+            self.nbytes += nbytes
+            while len(self.entries) > self.max_entries or self.nbytes > self.max_bytes:
+                self.nbytes -= self.entries.popitem(last = False)[1][1]
+                self.evictions += 1
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+    
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.nbytes, "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+#function to estimate the number of bytes of a callback result once serialized to JSON, walking it instead of serializing it a second time
+#(dash serializes it anyway). numbers are counted as 8 bytes, arrays by their number of items, and static objects by their cached JSON once encoded
+def estimate_json_size(obj):
+    
+    if isinstance(obj, str):
+        return len(obj) + 2
+    elif isinstance(obj, dict):
+        return sum(estimate_json_size(key) + estimate_json_size(val) + 2 for key, val in obj.items()) + 2
+    elif isinstance(obj, (list, tuple)):
+        return sum(estimate_json_size(val) + 1 for val in obj) + 2
+    elif isinstance(obj, (pd.Series, pd.Index)):
+        return estimate_json_size(obj.to_numpy())
+    elif isinstance(obj, np.ndarray):
+        return obj.size * 8 + 2 if obj.dtype.kind in "iubf" else estimate_json_size(obj.tolist())
+    elif isinstance(obj, StaticJSON):
+        return len(obj.encoded) if obj.encoded is not None else estimate_json_size(obj.obj)
+    elif isinstance(obj, Component):
+        #the props of a component are its public attributes (see FastJSONEncoder), plus about 60 bytes for its type and namespace
+        return sum(estimate_json_size(key) + estimate_json_size(val) + 2 for key, val in obj.__dict__.items() if key not in component_meta_attributes) + 60
+    elif hasattr(obj, "to_plotly_json"):
+        return estimate_json_size(obj.to_plotly_json())
+    
+    return 8
+
+#decorator caching the results of a callback by its input values. it is placed under @app.callback so that dash calls the cached version
+def cache_callback(func):
+    
+    cache = CallbackCache(func.__name__, cache_max_entries, cache_max_bytes)
+    callback_caches[func.__name__] = cache
+    callback_funcs[func.__name__] = func
+    
+    @functools.wraps(func)
+    def cached_func(*args):
+        start_callback_stage()
+        key = (data_version, json.dumps(args))
+        found, result = cache.get(key)
+        if found:
+            end_callback_stage("cache")
+            return result
+        
+        #serve the result from the precomputed store if it is there, otherwise compute it
+        result, nbytes = read_precomputed(func.__name__, args)
+        end_callback_stage("cache")
+        if result is None:
+            result = func(*args)
+            start_callback_stage()
+            nbytes = estimate_json_size(result)
+        cache.put(key, result, nbytes)
+        end_callback_stage("cache")
+        return result
+    
+    #the cache key names the version of the loaded datasets, so the lookup holds them as well (see read_snapshot)
+    return read_snapshot(cached_func)
+
+#function to drop every cached callback result, e.g. after the input data has been reloaded
+def invalidate_callback_caches():
+    
+    global data_version
+    data_version += 1
+    for cache in callback_caches.values():
+        cache.clear()
+
+#function to return the hit/miss counters and size of each callback cache
+def get_callback_cache_stats():
+    
+    return {name: cache.stats() for name, cache in callback_caches.items()}
+
+#------------------------------------------------------------------------------
+#PRECOMPUTED CALLBACK RESULTS
+#------------------------------------------------------------------------------
+
+#folder holding the callback results written by --precompute. each result is saved once under the hash of its serialized JSON (objects folder),
+#and a reference file named after the hash of the callback name and input values points to it (refs folder, one per version of the data and code)
+precompute_dir = os.environ.get("MEDICARE_PRECOMPUTE_DIR", os.path.join(data_dir, "precomputed"))
+
+#function to return a fingerprint of the input datasets and of this file, so that results precomputed from other data or code are not served
+def get_data_fingerprint(hha_df, hs_df, ho_df):
+    
+    fingerprint = hashlib.sha256()
+    for df in [hha_df, hs_df, ho_df]:
+        fingerprint.update(pd.util.hash_pandas_object(df, index = False).values.tobytes())
+    with open(os.path.abspath(__file__), "rb") as src_file:
+        fingerprint.update(src_file.read())
+    
+    return fingerprint.hexdigest()[:16]
+
+#function to return the location of the reference file for a callback and its input values
+def get_precompute_ref_path(name, args):
+    
+    ref_hash = hashlib.sha256(json.dumps([name, list(args)]).encode("utf-8")).hexdigest()
+    
+    return os.path.join(precompute_dir, "refs", data_fingerprint, ref_hash[:2], ref_hash)
+
+#function to return the location of a result saved under the given hash
+def get_precompute_object_path(obj_hash):
+    
+    return os.path.join(precompute_dir, "objects", obj_hash[:2], obj_hash + ".json")
+
+#function to return the precomputed result of a callback and the size of its serialized JSON, or (None, 0) if the result has not been precomputed
+def read_precomputed(name, args):
+    
+    try:
+        with open(get_precompute_ref_path(name, args)) as ref_file:
+            obj_hash = ref_file.read().strip()
+        with open(get_precompute_object_path(obj_hash)) as obj_file:
+            result_json = obj_file.read()
+    except OSError:
+        return None, 0
+    
+    return json.loads(result_json), len(result_json)
+
+#function to write a file through a temporary file so that readers never see a partially written file
+def write_file_atomic(filepath, text):
+    
+    os.makedirs(os.path.dirname(filepath), exist_ok = True)
+    tmp_path = "{0}.{1}.tmp".format(filepath, os.getpid())
+    with open(tmp_path, "w") as out_file:
+        out_file.write(text)
+    os.replace(tmp_path, filepath)
+
+#function to compute and save the results of a callback for a list of input values, skipping results that are already saved.
+#runs in the worker processes started by precompute_all_results. returns the number of results written and the number of input values that raised an error
+def precompute_results(name, args_lst):
+    
+    nwritten = 0
+    nfailed = 0
+    for args in args_lst:
+        ref_path = get_precompute_ref_path(name, args)
+        if os.path.exists(ref_path):
+            continue
+        
+        #input values that raise an error are left to be computed live
+        try:
+            result_json = json.dumps(callback_funcs[name](*args), cls = PlotlyJSONEncoder)
+        except Exception:
+            nfailed += 1
+            continue
+        obj_hash = hashlib.sha256(result_json.encode("utf-8")).hexdigest()
+        obj_path = get_precompute_object_path(obj_hash)
+        if not os.path.exists(obj_path):
+            write_file_atomic(obj_path, result_json)
+        write_file_atomic(ref_path, obj_hash)
+        nwritten += 1
+    
+    return nwritten, nfailed
+
+#function to list every combination of input values that each cached callback can receive from the dashboard
+def get_precompute_inputs():
+    
+    hh_groups = {"State": hha_choro_states, "Type of Ownership": hha_ownership_types, "PPR Performance Categorization": hha_ppr_types}
+    hs_years = range(int(min(hs_start_years)), int(max(hs_end_years)) + 1)
+    
+    return {"show_sum_boxes": [(metric, st) for metric in choro_metrics for st in ["All"] + list(hha_choro_states)],
+            "render_hh_histplot": [(metric, compare_type, grp1, grp2) for metric in hh_hist_metrics for compare_type in hh_hist_compare_type
+                                   for grp1 in hh_groups[compare_type] for grp2 in hh_groups[compare_type]],
+            "create_rank_table": [(st, msr, [start_yr, end_yr], rank5_opt, avg_type) for st in ["All"] + list(hs_states) for msr in hs_measures
+                                  for start_yr in hs_years for end_yr in hs_years if start_yr <= end_yr
+                                  for rank5_opt in ["Top 5", "Bottom 5"] for avg_type in ["Mean", "Median"]],
+            "create_hospital_pies": [(st, msr, value_cat, pmt_cat) for st in ["All"] + list(ho_states) for msr in ho_measures
+                                     for value_cat in ho_val_cat for pmt_cat in ho_pmt_cat]}
+
+#function to precompute the results of the given callbacks (all cached callbacks by default) for every combination of input values in a pool of worker processes
+def precompute_all_results(names = None, nworkers = None, chunk_size = 200):
+    
+    precompute_inputs = get_precompute_inputs()
+    
+    #a DuckDB connection cannot be used from a forked process, so with the duckdb query backend the workers are started afresh and each loads the datasets
+    #and opens its own connection. otherwise they are forked and share the loaded datasets
+    mp_context = multiprocessing.get_context("spawn") if query_con is not None else None
+    with concurrent.futures.ProcessPoolExecutor(max_workers = nworkers, mp_context = mp_context) as executor:
+        for name in (names or list(precompute_inputs)):
+            args_lst = precompute_inputs[name]
+            futures = [executor.submit(precompute_results, name, args_lst[i:i+chunk_size]) for i in range(0, len(args_lst), chunk_size)]
+            counts = [future.result() for future in futures]
+            print("{0}: {1:,} input combinations, {2:,} results written, {3:,} failed".format(name, len(args_lst), sum(c[0] for c in counts), sum(c[1] for c in counts)))
+
+data_fingerprint = get_data_fingerprint(hha_df, hs_df, ho_df)
+
+#------------------------------------------------------------------------------
+#FAST JSON SERIALIZATION
+#------------------------------------------------------------------------------
+
+#set MEDICARE_FAST_JSON=1 to serialize the callback responses and page layout with FastJSONEncoder instead of the default plotly encoder.
+#floats are rounded to MEDICARE_JSON_DIGITS decimal places (6 by default)
+fast_json_enabled = os.environ.get("MEDICARE_FAST_JSON", "0") == "1"
+json_float_digits = int(os.environ.get("MEDICARE_JSON_DIGITS", 6))
+
+#function to convert a numpy array to a list, rounding floats and replacing NaN/infinite values with None (null) in a single pass over the array
+def array_to_json_native(arr):
+    
+    if arr.dtype.kind == "f":
+        finite = np.isfinite(arr)
+        arr = np.round(arr, json_float_digits)
+        return arr.tolist() if finite.all() else np.where(finite, arr, None).tolist()
+    
+    return arr.tolist()
+
+#attributes dash sets on every component besides its props
+component_meta_attributes = {"_prop_names", "_type", "_namespace", "_valid_wildcard_attributes", "available_properties", "available_wildcard_properties"}
+
+#json encoder converting numpy/pandas data with whole-array operations instead of element by element, and splicing in the cached JSON of static objects.
+#anything it does not recognise falls back to the plotly encoder
+class FastJSONEncoder(PlotlyJSONEncoder):
+    
+    def default(self, obj):
+        
+        if isinstance(obj, StaticJSON):
+            if obj.encoded is None:
+                obj.encoded = json.dumps(obj.obj, cls = FastJSONEncoder)
+            self.static_objs[id(obj)] = obj
+            return "\0static_json{0}\0".format(id(obj))
+        elif isinstance(obj, np.ndarray) and obj.dtype.kind in "iubfOUS":
+            return array_to_json_native(obj)
+        elif isinstance(obj, (pd.Series, pd.Index)) and obj.dtype.kind in "iubfO":
+            return array_to_json_native(obj.to_numpy())
+        elif isinstance(obj, np.generic):
+            return obj.item()
+        elif isinstance(obj, Component):
+            #the props of a component are the public attributes set on it, which is what Component.to_plotly_json finds by checking every possible prop name
+            return {"props": {key: val for key, val in obj.__dict__.items() if key not in component_meta_attributes},
+                    "type": obj._type,
+                    "namespace": obj._namespace}
+        elif hasattr(obj, "to_plotly_json"):
+            return obj.to_plotly_json()
+        
+        return super(FastJSONEncoder, self).default(obj)
+    
+    def encode(self, o):
+        
+        self.static_objs = {}
+        encoded_o = json.JSONEncoder.encode(self, o)
+        
+        #NaN or infinite python floats (not in arrays) are turned into null the same way as the plotly encoder does
+        if "NaN" in encoded_o or "Infinity" in encoded_o:
+            encoded_o = json.dumps(json.loads(encoded_o, parse_constant = self.coerce_to_strict),
+                                   sort_keys = self.sort_keys, indent = self.indent, separators = (self.item_separator, self.key_separator))
+        
+        for obj_id, static_obj in self.static_objs.items():
+            encoded_o = encoded_o.replace(json.dumps("\0static_json{0}\0".format(obj_id)), static_obj.encoded)
+        
+        return encoded_o
+
+#dash serializes callback responses and the page layout with plotly.utils.PlotlyJSONEncoder
+if fast_json_enabled:
+    pyo.utils.PlotlyJSONEncoder = FastJSONEncoder
+
+#------------------------------------------------------------------------------
+#CALLBACK METRICS
+#------------------------------------------------------------------------------
+
+#set MEDICARE_METRICS=0 to turn off the timing of callback requests. the latency of each callback and of each of its stages is served
+#as histograms on the /metrics route (in the Prometheus text format) and returned in the Server-Timing header of each callback response
+metrics_enabled = os.environ.get("MEDICARE_METRICS", "1") == "1"
+
+#upper bounds (in seconds) of the buckets of the latency histograms
+metrics_buckets = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+#maximum number of input value combinations with their own latency histogram. requests with other input values are counted under inputs="other"
+metrics_max_input_series = int(os.environ.get("MEDICARE_METRICS_MAX_INPUTS", 1000))
+
+#folder shared by the worker processes of the dashboard server (none by default). each process handles its own requests, so without it a scrape of
+#/metrics returns the histograms of the process that served it, labelled with its pid. with it, each process saves its histograms there every
+#MEDICARE_METRICS_FLUSH_INTERVAL seconds, and a scrape returns the histograms summed across every process that saved them
+metrics_dir = os.environ.get("MEDICARE_METRICS_DIR", "")
+metrics_flush_interval = float(os.environ.get("MEDICARE_METRICS_FLUSH_INTERVAL", 5))
+metrics_flushed = 0.0
+
+#latency histograms of each callback by (callback name, stage) and by (callback name, input values)
+stage_histograms = {}
+input_histograms = {}
+metrics_lock = threading.Lock()
+
+#stage timings of the callback request handled by the current thread
+request_timing = threading.local()
+
+#histogram counting the number of latencies in each bucket
+class LatencyHistogram:
+    
+    def __init__(self):
+        self.counts = [0] * (len(metrics_buckets) + 1)
+        self.total_secs = 0.0
+        self.count = 0
+    
+    def observe(self, secs):
+        self.counts[bisect.bisect_left(metrics_buckets, secs)] += 1
+        self.total_secs += secs
+        self.count += 1
+    
+    #return the lines of the histogram in the Prometheus text format, with cumulative bucket counts
+    def to_text(self, name, labels):
+        lines = []
+        cum_count = 0
+        for le, count in zip(metrics_buckets + ["+Inf"], self.counts):
+            cum_count += count
+            lines.append('{0}_bucket{{{1},le="{2}"}} {3}'.format(name, labels, le, cum_count))
+        lines.append("{0}_sum{{{1}}} {2}".format(name, labels, self.total_secs))
+        lines.append("{0}_count{{{1}}} {2}".format(name, labels, self.count))
+        return lines
+    
+    #add the counts of another histogram, e.g. one saved by another process
+    def merge(self, counts, total_secs, count):
+        self.counts = [own_count + other_count for own_count, other_count in zip(self.counts, counts)]
+        self.total_secs += total_secs
+        self.count += count
+
+#function to return latency histograms as lists of [key..., bucket counts, total seconds, count], e.g. to save them to metrics_dir
+def dump_histograms(histograms):
+    
+    return [list(key) + [hist.counts, hist.total_secs, hist.count] for key, hist in histograms.items()]
+
+#function to add latency histograms returned by dump_histograms to a dict of histograms by key
+def merge_histograms(histograms, rows):
+    
+    for row in rows:
+        histograms.setdefault(tuple(row[:-3]), LatencyHistogram()).merge(*row[-3:])
+    
+    return histograms
+
+#function to save the latency histograms of this process to metrics_dir
+def write_metrics_file():
+    
+    global metrics_flushed
+    
+    with metrics_lock:
+        metrics_flushed = time.monotonic()
+        metrics_json = json.dumps({"stage": dump_histograms(stage_histograms), "inputs": dump_histograms(input_histograms)})
+    write_file_atomic(os.path.join(metrics_dir, "{0}.json".format(os.getpid())), metrics_json)
+
+#function to return the latency histograms saved to metrics_dir by every process, summed by key
+def read_metrics_files():
+    
+    stage_hists = {}
+    input_hists = {}
+    for filepath in glob.glob(os.path.join(metrics_dir, "*.json")):
+        try:
+            with open(filepath) as in_file:
+                metrics_json = json.load(in_file)
+        except (OSError, ValueError):
+            continue
+        merge_histograms(stage_hists, metrics_json["stage"])
+        merge_histograms(input_hists, metrics_json["inputs"])
+    
+    return stage_hists, input_hists
+
+#function to start timing the next stage of the current callback request
+def start_callback_stage():
+    
+    if getattr(request_timing, "stages", None) is not None:
+        request_timing.stage_start = time.perf_counter()
+
+#function to record the seconds spent in a stage of the current callback request, i.e. since the previous stage ended. the stages are
+#cache (cache and precomputed store lookups), filter, aggregate, rank, figure (building the figures and tables) and serialize.
+#does nothing outside of a callback request, e.g. when results are precomputed
+def end_callback_stage(stage):
+    
+    stages = getattr(request_timing, "stages", None)
+    if stages is None:
+        return
+    
+    now = time.perf_counter()
+    stages[stage] = stages.get(stage, 0) + now - request_timing.stage_start
+    request_timing.stage_start = now
+
+#function to return the input values of a callback request as a label, e.g. ["CA", "Heart Attack Measure", ...]
+def get_inputs_label(inputs):
+    
+    #inputs of pattern-matching ids (ALL) are lists of inputs
+    return json.dumps([inp.get("value") if isinstance(inp, dict) else [sub_inp.get("value") for sub_inp in inp] for inp in inputs])
+
+#function to return the name of the callback called by the current request and its input values as a label, looked up from the request body
+#(already parsed by dash)
+def get_request_callback():
+    
+    body = flask.request.get_json(silent = True) or {}
+    callback_func = app.callback_map.get(body.get("output"), {}).get("callback")
+    callback_name = callback_func.__name__ if callback_func is not None else "unknown"
+    
+    return callback_name, get_inputs_label(body.get("inputs", []))
+
+#function to add the timings of a callback request to the latency histograms
+def observe_callback_timing(name, inputs_label, stages, total_secs):
+    
+    with metrics_lock:
+        for stage, secs in list(stages.items()) + [("total", total_secs)]:
+            stage_histograms.setdefault((name, stage), LatencyHistogram()).observe(secs)
+        
+        if (name, inputs_label) not in input_histograms and len(input_histograms) >= metrics_max_input_series:
+            inputs_label = "other"
+        input_histograms.setdefault((name, inputs_label), LatencyHistogram()).observe(total_secs)
+
+#function to escape a label value for the Prometheus text format
+def escape_metric_label(val):
+    
+    return val.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+#function to return every latency histogram in the Prometheus text format, summed across processes if metrics_dir is set and labelled with
+#the pid of this process otherwise
+def get_metrics_text():
+    
+    if metrics_dir:
+        write_metrics_file()
+        stage_hists, input_hists = read_metrics_files()
+        pid_label = ""
+    else:
+        with metrics_lock:
+            stage_hists = merge_histograms({}, dump_histograms(stage_histograms))
+            input_hists = merge_histograms({}, dump_histograms(input_histograms))
+        pid_label = ',pid="{0}"'.format(os.getpid())
+    
+    lines = ["# HELP medicare_callback_stage_seconds Latency of each stage of the dashboard callbacks. stage total is the whole request",
+             "# TYPE medicare_callback_stage_seconds histogram"]
+    for (name, stage), hist in sorted(stage_hists.items()):
+        lines += hist.to_text("medicare_callback_stage_seconds", 'callback="{0}",stage="{1}"{2}'.format(name, stage, pid_label))
+    
+    lines += ["# HELP medicare_callback_seconds Latency of the dashboard callbacks by input values",
+              "# TYPE medicare_callback_seconds histogram"]
+    for (name, inputs_label), hist in sorted(input_hists.items()):
+        lines += hist.to_text("medicare_callback_seconds", 'callback="{0}",inputs="{1}"{2}'.format(name, escape_metric_label(inputs_label), pid_label))
+    
+    return "\n".join(lines) + "\n"
+
+#function run before each request to the dashboard server, starting the stage timings of callback requests
+def start_request_timing():
+    
+    if flask.request.path.endswith("_dash-update-component"):
+        request_timing.stages = OrderedDict()
+        request_timing.request_start = request_timing.stage_start = time.perf_counter()
+    else:
+        request_timing.stages = None
+
+#function run after each request to the dashboard server, adding the timings of callback requests to the histograms and to the Server-Timing header
+def record_request_timing(response):
+    
+    stages = getattr(request_timing, "stages", None)
+    if stages is None:
+        return response
+    request_timing.stages = None
+    total_secs = time.perf_counter() - request_timing.request_start
+    
+    callback_name, inputs_label = get_request_callback()
+    observe_callback_timing(callback_name, inputs_label, stages, total_secs)
+    if metrics_dir and time.monotonic() - metrics_flushed > metrics_flush_interval:
+        try:
+            write_metrics_file()
+        except OSError as err:
+            print("Unable to save metrics to {0}: {1}".format(metrics_dir, err))
+    
+    response.headers["Server-Timing"] = ", ".join("{0};dur={1:.2f}".format(stage, secs*1000) for stage, secs in list(stages.items()) + [("total", total_secs)])
+    
+    return response
+
+#function serving the /metrics route
+def serve_metrics():
+    
+    return flask.Response(get_metrics_text(), mimetype = "text/plain; version=0.0.4")
+
+#json encoder timing the serialization of callback responses, on top of the encoder used by dash (the plotly encoder or FastJSONEncoder)
+class TimedJSONEncoder(pyo.utils.PlotlyJSONEncoder):
+    
+    def encode(self, o):
+        start_callback_stage()
+        encoded_o = super().encode(o)
+        end_callback_stage("serialize")
+        return encoded_o
+
+if metrics_enabled:
+    app.server.before_request(start_request_timing)
+    app.server.after_request(record_request_timing)
+    app.server.add_url_rule("/metrics", "metrics", serve_metrics)
+    pyo.utils.PlotlyJSONEncoder = TimedJSONEncoder
+
+#------------------------------------------------------------------------------
+#CALLBACK PROFILING
+#------------------------------------------------------------------------------
+
+#share of callback requests to profile (0 by default, i.e. none). requests sent with the X-Profile-Token header set to MEDICARE_PROFILE_TOKEN
+#are always profiled, so that a slow combination of input values can be profiled on demand. the header is ignored if no token is set
+profile_rate = float(os.environ.get("MEDICARE_PROFILE_RATE", 0))
+profile_token = os.environ.get("MEDICARE_PROFILE_TOKEN", "")
+
+#format of the profiles: pstats (every function call traced by cProfile, for pstats or snakeviz) or collapsed (call stacks sampled every
+#MEDICARE_PROFILE_INTERVAL seconds, one line per stack, for flamegraph.pl or speedscope). sampling slows down the profiled requests much less
+profile_format = os.environ.get("MEDICARE_PROFILE_FORMAT", "pstats")
+profile_interval = float(os.environ.get("MEDICARE_PROFILE_INTERVAL", 0.005))
+
+#folder the profiles are written to. each profile is saved with a JSON file holding the callback name, input values and duration of the request
+profile_dir = os.environ.get("MEDICARE_PROFILE_DIR", os.path.join(data_dir, "profiles"))
+
+#profiler of the callback request handled by the current thread
+request_profile = threading.local()
+
+#thread sampling the call stack of another thread at a fixed interval, counting the number of samples of each stack
+class StackSampler(threading.Thread):
+    
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon = True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self.stop_event = threading.Event()
+    
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append("{0}:{1}".format(os.path.basename(frame.f_code.co_filename), frame.f_code.co_name))
+                frame = frame.f_back
+            stack = ";".join(reversed(stack))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+    
+    #stop sampling and return the stacks in the collapsed format, i.e. one line per stack (outermost function first) followed by its number of samples
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+        return "".join("{0} {1}\n".format(stack, nsamples) for stack, nsamples in self.stacks.items())
+
+#function to return whether to profile the current callback request
+def should_profile_request():
+    
+    if profile_token and hmac.compare_digest(flask.request.headers.get("X-Profile-Token", ""), profile_token):
+        return True
+    
+    return profile_rate > 0 and random.random() < profile_rate
+
+#function run before each request to the dashboard server, starting the profiler of the callback requests to profile
+def start_request_profile():
+    
+    request_profile.profiler = None
+    if not flask.request.path.endswith("_dash-update-component") or not should_profile_request():
+        return
+    
+    if profile_format == "collapsed":
+        profiler = StackSampler(threading.get_ident(), profile_interval)
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            #python 3.12+ allows a single cProfile at a time, so the request is not profiled if another one is
+            return
+    
+    request_profile.profiler = profiler
+    request_profile.start = time.perf_counter()
+
+#function run at the end of each request to the dashboard server, writing the profile of a profiled callback request to the profile folder
+def write_request_profile(exc = None):
+    
+    profiler = getattr(request_profile, "profiler", None)
+    if profiler is None:
+        return
+    request_profile.profiler = None
+    
+    if profile_format == "collapsed":
+        profile_text = profiler.stop()
+    else:
+        profiler.disable()
+    profile_secs = time.perf_counter() - request_profile.start
+    
+    #profiles are named after the time, callback and a hash of the input values, e.g. 1603991234567_create_rank_table_3f2a9c0b1d_1234.prof
+    callback_name, inputs_label = get_request_callback()
+    profile_path = os.path.join(profile_dir, "{0}_{1}_{2}_{3}".format(int(time.time()*1000), callback_name,
+                                                                      hashlib.sha1(inputs_label.encode("utf-8")).hexdigest()[:10], os.getpid()))
+    #a profile that cannot be saved (e.g. the disk is full) is logged and dropped, so that profiling never changes the outcome of the request
+    try:
+        os.makedirs(profile_dir, exist_ok = True)
+        if profile_format == "collapsed":
+            write_file_atomic(profile_path + ".collapsed", profile_text)
+        else:
+            profiler.dump_stats(profile_path + ".prof")
+        write_file_atomic(profile_path + ".json", json.dumps({"callback": callback_name, "inputs": json.loads(inputs_label), "secs": round(profile_secs, 6),
+                                                              "format": profile_format, "error": repr(exc) if exc is not None else None}))
+    except Exception as err:
+        print("Unable to save profile to {0}: {1!r}".format(profile_path, err))
+
+if profile_rate > 0 or profile_token:
+    app.server.before_request(start_request_profile)
+    app.server.teardown_request(write_request_profile)
+
+#------------------------------------------------------------------------------
+#RELOADING NEW DATA RELEASES
+#------------------------------------------------------------------------------
+
+#seconds between checks of data_dir for new releases of the input files (0 by default, i.e. never). a new release is loaded once its file has
+#stopped changing between two checks, and the datasets, summary statistics and dropdown menu options built from it are swapped in without a restart
+reload_interval = float(os.environ.get("MEDICARE_RELOAD_INTERVAL", 0))
+
+#lock letting any number of callbacks read the loaded datasets while no new release is being swapped in. a swap waits for the callbacks
+#in flight to finish with the old datasets, and callbacks starting meanwhile wait for the swap, which only replaces references
+class SnapshotLock:
+    
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.nreaders = 0
+        self.nwriters = 0
+    
+    def acquire_read(self):
+        with self.cond:
+            while self.nwriters > 0:
+                self.cond.wait()
+            self.nreaders += 1
+    
+    def release_read(self):
+        with self.cond:
+            self.nreaders -= 1
+            if self.nreaders == 0:
+                self.cond.notify_all()
+    
+    #block new readers, then wait for the current readers to finish
+    def acquire_write(self):
+        with self.cond:
+            self.nwriters += 1
+            while self.nreaders > 0:
+                self.cond.wait()
+    
+    def release_write(self):
+        with self.cond:
+            self.nwriters -= 1
+            self.cond.notify_all()
+
+snapshot_lock = SnapshotLock()
+
+#number of nested calls to callbacks reading the loaded datasets in the current thread (see read_snapshot)
+request_snapshot = threading.local()
+
+#lock letting a single thread load a new release at a time
+reload_lock = threading.Lock()
+
+#function to return the releases of each input file read in by the dashboard (see find_input_releases), as (setting, file, size, modification time)
+#of the file read for each release (None if it is missing)
+def get_input_state():
+    
+    input_state = []
+    for setting, filepaths in find_input_releases().items():
+        for filepath in filepaths:
+            try:
+                source_stat = os.stat(get_source_path(filepath))
+                input_state.append((setting, filepath, source_stat.st_size, source_stat.st_mtime_ns))
+            except OSError:
+                input_state.append((setting, filepath, None, None))
+    
+    return tuple(input_state)
+
+#input files behind the loaded datasets
+loaded_input_state = get_input_state()
+
+#decorator holding the loaded datasets for the duration of a callback reading them (cached callbacks are held by cache_callback). callbacks that
+#do not read them, e.g. the news callbacks waiting on NewsAPI, are not decorated so that a swap neither waits for them nor holds them up.
+#a callback calling another one holds a single read lock, since a second one would wait behind a pending swap that waits for the first
+def read_snapshot(func):
+    
+    @functools.wraps(func)
+    def snapshot_func(*args):
+        depth = getattr(request_snapshot, "depth", 0)
+        if depth == 0 and reload_interval > 0:
+            snapshot_lock.acquire_read()
+        request_snapshot.depth = depth + 1
+        try:
+            return func(*args)
+        finally:
+            request_snapshot.depth = depth
+            if depth == 0 and reload_interval > 0:
+                snapshot_lock.release_read()
+    
+    return snapshot_func
+
+#function to load the given input files (see get_input_state) and swap the datasets built from them in for the loaded ones. everything is read
+#and built before the swap, so callback requests only wait for the global variables to be replaced
+def reload_data(input_state):
+    
+    with reload_lock:
+        reload_start = time.perf_counter()
+        filepaths = [filepath for setting, filepath, size, mtime in input_state]
+        new_filepaths = {setting: [filepath for file_setting, filepath, size, mtime in input_state if file_setting == setting] for setting in input_releases}
+        
+        snapshot = build_data_snapshot(load_input_file(new_filepaths["hha"][-1], hha_columns, clean_hha_df),
+                                       load_hs_releases(new_filepaths["hs"]),
+                                       load_input_file(new_filepaths["ho"][-1], ho_columns, clean_ho_df))
+        if shared_data_enabled:
+            snapshot.update(publish_shared_frames({name: snapshot[name] for name in shared_frame_names}, filepaths))
+        snapshot.update({"input_filepaths": new_filepaths,
+                         "hha_filepath": new_filepaths["hha"][-1],
+                         "hs_filepaths": new_filepaths["hs"],
+                         "ho_filepath": new_filepaths["ho"][-1],
+                         "loaded_input_state": input_state,
+                         "data_fingerprint": get_data_fingerprint(snapshot["hha_df"], snapshot["hs_df"], snapshot["ho_df"])})
+        
+        snapshot_lock.acquire_write()
+        try:
+            globals().update(snapshot)
+            hh_choro_store.data = build_hh_choro_data()
+            content_pages.clear()
+            invalidate_callback_caches()
+        finally:
+            snapshot_lock.release_write()
+        
+        print("Loaded {0} in {1:.2f}s".format(", ".join(os.path.basename(filepath) for filepath in filepaths), time.perf_counter() - reload_start))
+
+#function run by the data watcher thread, checking data_dir every reload_interval seconds and loading new releases once their files stop changing
+def watch_data_dir():
+    
+    prev_state = loaded_input_state
+    failed_state = None
+    while True:
+        time.sleep(reload_interval)
+        input_state = get_input_state()
+        
+        #a file still being copied into data_dir changes between checks, and a missing file or a release that failed to load is not retried until it changes
+        if input_state != loaded_input_state and input_state == prev_state and input_state != failed_state and all(size is not None for setting, filepath, size, mtime in input_state):
+            try:
+                reload_data(input_state)
+            except Exception as err:
+                #keep serving the loaded datasets, e.g. if the new file is malformed
+                print("Unable to load {0}: {1!r}".format(", ".join(filepath for setting, filepath, size, mtime in input_state), err))
+                failed_state = input_state
+        prev_state = input_state
+
+#data watcher thread, and the process that started it. threads do not survive a fork, so a WSGI server forking worker processes from a loaded
+#app (e.g. gunicorn --preload) leaves each worker to start its own watcher on its first request
+data_watcher = None
+data_watcher_pid = None
+data_watcher_lock = threading.Lock()
+
+#function run before each request to the dashboard server, starting the data watcher thread of this process if reload_interval is set
+def start_data_watcher():
+    
+    global data_watcher, data_watcher_pid
+    
+    if reload_interval > 0 and data_watcher_pid != os.getpid():
+        with data_watcher_lock:
+            if data_watcher_pid != os.getpid():
+                data_watcher = threading.Thread(target = watch_data_dir, name = "data_watcher", daemon = True)
+                data_watcher.start()
+                data_watcher_pid = os.getpid()
+
+if reload_interval > 0:
+    app.server.before_request(start_data_watcher)
+
 #------------------------------------------------------------------------------
 #CALLBACK APPLIED ACROSS CONTENT PAGES
 #------------------------------------------------------------------------------
 
+#clientside callbacks to draw each graph by merging the trace data (and layout properties) returned by its server callback into the figure template of the graph
+for graph_id in ["hh_histplot", "hs_msr_comp_bar", "hs_reg_comp_bar", "ho_value_pie", "ho_cost_pie"]:
+    app.clientside_callback(
+        """
+        function(fig_update, templates) {
+            if (!fig_update || !templates) {
+                return window.dash_clientside.no_update;
+            }
+            
+            //copy the template, replacing (nested) properties with the updated ones
+            var merge = function(base, update) {
+                var merged = Object.assign({}, base);
+                Object.keys(update).forEach(function(key) {
+                    var is_obj = function(val) { return val !== null && typeof val === "object" && !Array.isArray(val); };
+                    merged[key] = (is_obj(update[key]) && is_obj(base[key])) ? merge(base[key], update[key]) : update[key];
+                });
+                return merged;
+            };
+            
+            var template = templates[fig_update.template];
+            return {"data": fig_update.data.map(function(trace, i) { return merge(template.data[i] || {}, trace); }),
+                    "layout": merge(template.layout, fig_update.layout || {})};
+        }
+        """,
+        Output(component_id = graph_id, component_property = "figure"),
+        [Input(component_id = graph_id + "_update", component_property = "data")],
+        [State(component_id = "figure_templates", component_property = "data")])
+
 #callback to update the curretn url
 @app.callback(Output(component_id = "url", component_property = "pathname"),
               [Input(component_id = "ho_link", component_property = "n_clicks"),
@@ -695,50 +2546,57 @@ def update_url_link(ho_nclicks, hh_nclicks, hs_nclicks, ho_ref, hh_ref, hs_ref):
                Output(component_id = "hh_link", component_property = "active"),
                Output(component_id = "hs_link", component_property = "active")],
               [Input(component_id = "url", component_property = "pathname")])
+@read_snapshot
 def return_content_page(pathname):
 
     if pathname == "/":
-        return [ho_page, True, False, False]
+        return [get_content_page("ho"), True, False, False]
     elif pathname == "/hospitals":
-        return [ho_page, True, False, False]
+        return [get_content_page("ho"), True, False, False]
     elif pathname == "/home-health-agencies":
-        return [hh_page, False, True, False]
+        return [get_content_page("hh"), False, True, False]
     elif pathname == "/hospices":
-        return [hs_page, False, False, True]
+        return [get_content_page("hs"), False, False, True]
 
 
 #------------------------------------------------------------------------------
 #FOR HOME HEALTH CONTENT PAGE
 #------------------------------------------------------------------------------
         
-#callback to return the value of the selected choropleth summary metric
-@app.callback(Output(component_id = "hh_chorometric_input", component_property = "children"),
-              [Input(component_id = "choro_metric"+str(mt_ind), component_property = "n_clicks") for mt_ind in range(len(choro_metrics))])
-def get_chorometric_input(*args):
-    ctx = dash.callback_context
-    if (sum(args) == 0):
-        return choro_metrics[0]
-    else:
-        #find the index associated with the selected metric option
-        metric_ind = int(ctx.triggered[0]["prop_id"].split(".")[0].replace("choro_metric", ""))
-        return choro_metrics[metric_ind]
-    
-
-#callback to return the value of the selected choropleth state
-@app.callback(Output(component_id = "hh_chorostate_input", component_property = "children"),
-              [Input(component_id = "choro_stateall", component_property = "n_clicks")] +
-              [Input(component_id = "choro_state"+st_val, component_property = "n_clicks") for st_val in hha_choro_states])
-def get_chorostate_input(*args):
-    ctx = dash.callback_context
-    if (sum(args) == 0):
-        return "All"
-    else:
-        #find the index associated with the selected state option
-        state_ind = ctx.triggered[0]["prop_id"].split(".")[0].replace("choro_state", "")
-        if (state_ind == "all"):
-            return "All"
-        else:
-            return state_ind
+#clientside callback to return the selected choropleth summary metric and state. a click on a metric keeps the selected state and vice versa.
+#the metric and state reset to the first metric and All states whenever the home health page is rendered again
+app.clientside_callback(
+    """
+    function(metric_clicks, state_clicks, hh_choro_selection) {
+        if (metric_clicks.length === 0 || state_clicks.length === 0) {
+            return window.dash_clientside.no_update;
+        }
+        
+        var ctx = window.dash_clientside.callback_context;
+        var sum = function(clicks) { return clicks.reduce(function(total, n) { return total + (n || 0); }, 0); };
+        var selection = {"metric": ctx.inputs_list[0][0].id.index, "state": "All"};
+        if (hh_choro_selection && sum(metric_clicks) > 0) {
+            selection.metric = hh_choro_selection.metric;
+        }
+        if (hh_choro_selection && sum(state_clicks) > 0) {
+            selection.state = hh_choro_selection.state;
+        }
+        
+        //find the metric or state of the clicked menu item
+        ctx.triggered.forEach(function(trigger) {
+            if (trigger.value) {
+                var item_id = JSON.parse(trigger.prop_id.slice(0, trigger.prop_id.lastIndexOf(".")));
+                selection[item_id.type === "choro_metric" ? "metric" : "state"] = item_id.index;
+            }
+        });
+        
+        return selection;
+    }
+    """,
+    Output(component_id = "hh_choro_selection", component_property = "data"),
+    [Input(component_id = {"type": "choro_metric", "index": ALL}, component_property = "n_clicks"),
+     Input(component_id = {"type": "choro_state", "index": ALL}, component_property = "n_clicks")],
+    [State(component_id = "hh_choro_selection", component_property = "data")])
         
 
 #callback to return the value of the possible dropdown options based on the selected comparison type in the home health histogram plot
@@ -747,6 +2605,7 @@ def get_chorostate_input(*args):
                Output(component_id = "compare_grp1_dp", component_property = "value"),
                Output(component_id = "compare_grp2_dp", component_property = "value")],
               [Input(component_id = "compare_type_dp", component_property = "value")])
+@read_snapshot
 def show_histgrp_options(compare_type):
     
     if compare_type == "State":
@@ -765,9 +2624,22 @@ def show_histgrp_options(compare_type):
     return options_lst, options_lst, grp1_val, grp2_val
 
 
-#callback for return the description for each choropleth summary metric
-@app.callback(Output(component_id = "chorometric_descrip", component_property = "children"),
-              [Input(component_id = "hh_chorometric_input", component_property = "children")])
+#callback to return the description of the selected choropleth summary metric and the summary statistics for the selected state, in a single request
+@app.callback([Output(component_id = "chorometric_descrip", component_property = "children"),
+               Output(component_id = "summ_box_top", component_property = "children"),
+               Output(component_id = "summ_box_bottom", component_property = "children")],
+              [Input(component_id = "hh_choro_selection", component_property = "data")])
+@read_snapshot
+def show_choro_summary(hh_choro_selection):
+    
+    if hh_choro_selection is None:
+        raise PreventUpdate
+    
+    box_top_text, box_bottom_text = show_sum_boxes(hh_choro_selection["metric"], hh_choro_selection["state"])
+    
+    return show_chorometric_descrip(hh_choro_selection["metric"]), box_top_text, box_bottom_text
+
+#function to return the description for each choropleth summary metric
 def show_chorometric_descrip(hh_chorometric):
     
     return [dcc.Markdown("""**SUMMARY METRIC:**""", style = {"color": danger_color, "font-size": "12px"}),
@@ -775,27 +2647,22 @@ def show_chorometric_descrip(hh_chorometric):
             dcc.Markdown("""**DESCRIPTION:**""", style = {"color": danger_color, "font-size": "12px"}),
             dcc.Markdown("""{0}""".format(choro_metric_dict[hh_chorometric]), style = {"font-size": "12px"})]
 
-#callback for returning the summary description and statistic in the bottom and top boxes to the left of the choropleth map
-@app.callback([Output(component_id = "summ_box_top", component_property = "children"),
-               Output(component_id = "summ_box_bottom", component_property = "children")],
-              [Input(component_id = "hh_chorometric_input", component_property = "children"),
-               Input(component_id = "hh_chorostate_input", component_property = "children")])
+#function to return the summary description and statistic in the bottom and top boxes to the left of the choropleth map
+@cache_callback
 def show_sum_boxes(hh_chorometric, hh_chorostate):
     
     #determine whether to include a percent sign in shown results
     perc_sign = "%" if hh_chorometric in ["% of Providers Offering" + x.replace("Offers", "") for x in offer_metric_lst] else ""
     
+    #look up the precomputed summary of the selected state (or All states)
+    state_summary = hha_state_summary[hh_chorostate]
+    end_callback_stage("aggregate")
+    
     if hh_chorostate == "All":
     
-        #find the state that has the highest value for the given metric. if there is a tie, then the first state in alphabetical order will be used
-        max_ind = np.argwhere(hha_summ_df_st[hh_chorometric] == hha_summ_df_st[hh_chorometric].max())[0][0]
-        max_state = hha_summ_df_st.loc[max_ind, "State"]
-        max_val = hha_summ_df_st[hh_chorometric].max()
-        
-        #find the state that has the lowest value for the given metric. if there is a tien, then the first state in alphabetrical order wll be used
-        min_ind = np.argwhere(hha_summ_df_st[hh_chorometric] == hha_summ_df_st[hh_chorometric].min())[0][0]
-        min_state = hha_summ_df_st.loc[min_ind, "State"]
-        min_val = hha_summ_df_st[hh_chorometric].min()
+        #look up the states that have the highest and lowest value for the given metric. if there is a tie, then the first state in alphabetical order is used
+        max_state, max_val = state_summary[hh_chorometric]["max"]
+        min_state, min_val = state_summary[hh_chorometric]["min"]
     
         #define the text to display
         box_top_text = [dcc.Markdown("""**STATE WITH HIGHEST VALUE:**""", style = {"color": danger_color, "font-size": "12px"}),
@@ -810,9 +2677,8 @@ def show_sum_boxes(hh_chorometric, hh_chorostate):
             #define the name of the table header
             table_header = [html.Thead(html.Tr([html.Th("Type of Ownership"), html.Th("# of Providers")]))]
     
-            #count the number of providers by ownership type
-            ownership_cnt = hha_df[hha_df["State"] == hh_chorostate]["Type of Ownership"].value_counts()
-            body_lst = [html.Tr([html.Td(i), html.Td(ownership_cnt[i])]) for i in ownership_cnt.index]
+            #look up the number of providers by ownership type
+            body_lst = [html.Tr([html.Td(owner_val), html.Td(nprov)]) for owner_val, nprov in state_summary["Type of Ownership"]]
             table_body = [html.Tbody(body_lst)]
             
             table = dbc.Table(table_header + table_body, bordered = True, size = "sm", style = {"font-size": "10px"})
@@ -824,27 +2690,15 @@ def show_sum_boxes(hh_chorometric, hh_chorostate):
       
         elif (hh_chorometric in ["Quality of Patient Care", "Medicare Spending per Episode per Provider"]):
             
-            if (hh_chorometric == "Quality of Patient Care"):
-                varname = "Quality of patient care star rating"
-            elif (hh_chorometric == "Medicare Spending per Episode per Provider"):
-                varname = "How much Medicare spends on an episode of care at this agency, compared to Medicare spending across all agencies nationally"
+            varname = hha_extreme_metrics[hh_chorometric]
             
-            #filter to the specific state
-            state_df = hha_df[hha_df["State"] == hh_chorostate]
+            #look up the providers with the highest and lowest value in the state. if there is a tie, then the provider with the lowest CCN is used
+            max_name, max_ccn, max_val = state_summary[varname]["max"] or ("Not Available", "", "")
+            min_name, min_ccn, min_val = state_summary[varname]["min"] or ("Not Available", "", "")
             
-            #find the provider CCN with the highest star rating
-            max_val = state_df[varname].max()
-            max_ind = np.argwhere(state_df[varname] == max_val)[0][0]
-            max_ccn = state_df.iloc[max_ind]["CMS Certification Number (CCN)"]
-            max_name = state_df.iloc[max_ind]["Provider Name"]
             box_top_text = [dcc.Markdown("""**PROVIDER WITH HIGHEST VALUE:**""", style = {"color": danger_color, "font-size": "12px"}),
                             dcc.Markdown("""{0} (CCN# {1}): {2}{3}""".format(max_name, str(max_ccn).zfill(5), max_val, perc_sign), style = {"font-size": "12px"})]
             
-            #find the provider CCN with the lowest star rating
-            min_val = state_df[varname].min()
-            min_ind = np.argwhere(state_df[varname] == min_val)[0][0]
-            min_ccn = state_df.iloc[min_ind]["CMS Certification Number (CCN)"]
-            min_name = state_df.iloc[min_ind]["Provider Name"]
             box_bottom_text = [dcc.Markdown("""**PROVIDER WITH LOWEST VALUE:**""", style = {"color": danger_color, "font-size": "12px"}),
                                dcc.Markdown("""{0} (CCN# {1}): {2}{3}""".format(min_name, str(min_ccn).zfill(5), min_val, perc_sign), style = {"font-size": "12px"})]
             
@@ -857,9 +2711,8 @@ def show_sum_boxes(hh_chorometric, hh_chorostate):
             #define the name of the table header
             table_header = [html.Thead(html.Tr([html.Th("Offers Services"), html.Th("# of Providers")]))]
             
-            #count the number of providers by whether the provider does or does not offer a given service
-            offer_cnt = hha_df[hha_df["State"] == hh_chorostate][varname].map({1: "Yes", 0: "No"}).value_counts()
-            body_lst = [html.Tr([html.Td(i), html.Td(offer_cnt[i])]) for i in offer_cnt.index]
+            #look up the number of providers by whether the provider does or does not offer a given service
+            body_lst = [html.Tr([html.Td(offer_val), html.Td(nprov)]) for offer_val, nprov in state_summary[varname]]
             table_body = [html.Tbody(body_lst)]
             
             table = dbc.Table(table_header + table_body, bordered = True, size = "sm", style = {"font-size": "10px"})
@@ -868,14 +2721,13 @@ def show_sum_boxes(hh_chorometric, hh_chorostate):
                             table]
             
             box_bottom_text = ""
+    
+    end_callback_stage("figure")
             
     return box_top_text, box_bottom_text
     
 
-#callback to render the choropleth map on the HHA tab
-@app.callback(Output(component_id = "hh_choro_map", component_property = "figure"),
-              [Input(component_id = "hh_chorometric_input", component_property = "children"),
-               Input(component_id = "hh_chorostate_input", component_property = "children")])
+#function to render the choropleth map on the HHA tab. the map is drawn in the browser from the figure for All states (see the clientside callback below)
 def render_hh_choropleth(hh_chorometric, hh_chorostate):
     
     #if not All then subset to the relevant state
@@ -919,7 +2771,66 @@ def render_hh_choropleth(hh_chorometric, hh_chorostate):
         
     return hh_choro_fig
 
-@app.callback([Output(component_id = "hh_histplot", component_property = "figure"),
+#function to return the home health summary table and the base choropleth figure, shipped to the browser once with the page layout
+def build_hh_choro_data():
+    
+    return StaticJSON({"states": hha_summ_df_st["State"].tolist(),
+                       "metrics": {metric: hha_summ_df_st[metric].tolist() for metric in choro_metrics},
+                       "percent_metrics": ["% of Providers Offering" + x.replace("Offers", "") for x in offer_metric_lst],
+                       "figure": render_hh_choropleth(choro_metrics[0], "All").to_plotly_json()})
+
+hh_choro_store.data = build_hh_choro_data()
+
+#clientside callback to render the choropleth map on the HHA tab. switching the metric or state swaps the values, colorbar title and map bounds
+#of the stored base figure in the browser, without a request to the server
+app.clientside_callback(
+    """
+    function(hh_choro_selection, choro_data) {
+        if (!hh_choro_selection || !choro_data) {
+            return window.dash_clientside.no_update;
+        }
+        var hh_chorometric = hh_choro_selection.metric;
+        var hh_chorostate = hh_choro_selection.state;
+        
+        //copy the base figure so that the graph sees a new figure
+        var fig = JSON.parse(JSON.stringify(choro_data.figure));
+        var trace = fig.data[0];
+        var values = choro_data.metrics[hh_chorometric];
+        
+        //if not All then subset to the relevant state
+        var states = [], z = [], customdata = [];
+        for (var i = 0; i < choro_data.states.length; i++) {
+            if (hh_chorostate === "All" || choro_data.states[i] === hh_chorostate) {
+                states.push(choro_data.states[i]);
+                z.push(values[i]);
+                customdata.push([choro_data.states[i], values[i]]);
+            }
+        }
+        trace.locations = states;
+        trace.z = z;
+        trace.customdata = customdata;
+        trace.colorbar.title.text = "<b>" + hh_chorometric + "</b>";
+        trace.hovertemplate = "<b>%{customdata[0]}:</b> %{customdata[1]:,}" +
+                              (choro_data.percent_metrics.indexOf(hh_chorometric) >= 0 ? "%" : "") +
+                              "<extra></extra>";
+        
+        //set to highlight only the selected state on the map
+        if (hh_chorostate !== "All") {
+            fig.layout.geo.fitbounds = "locations";
+            fig.layout.geo.visible = false;
+        }
+        
+        return fig;
+    }
+    """,
+    Output(component_id = "hh_choro_map", component_property = "figure"),
+    [Input(component_id = "hh_choro_selection", component_property = "data")],
+    [State(component_id = "hh_choro_store", component_property = "data")])
+
+#header of the percentile tables below the home health histogram plot
+hh_hist_table_header = StaticJSON(html.Thead(html.Tr([html.Th("MIN"), html.Th("25th"), html.Th("50th"), html.Th("75th"), html.Th("MAX")])))
+
+@app.callback([Output(component_id = "hh_histplot_update", component_property = "data"),
                Output(component_id = "hist_summ_desc1", component_property = "children"),
                Output(component_id = "hist_summ_desc2", component_property = "children"),
                Output(component_id = "hist_summ_box1", component_property = "children"),
@@ -928,48 +2839,38 @@ def render_hh_choropleth(hh_chorometric, hh_chorostate):
                Input(component_id = "compare_type_dp", component_property = "value"), 
                Input(component_id = "compare_grp1_dp", component_property = "value"),
                Input(component_id = "compare_grp2_dp", component_property = "value")])
+@cache_callback
 def render_hh_histplot(metric_type, compare_type, compare_grp1, compare_grp2):
     
-    #filter to the respective comparison group
-    metric_grp1 = hha_df[hha_df[compare_type] == compare_grp1][metric_type]
-    metric_grp2 = hha_df[hha_df[compare_type] == compare_grp2][metric_type]
-    
-    #create histogram
-    fig = go.Figure()
-    fig.add_trace(go.Histogram(x = metric_grp1, name = compare_grp1, marker = {"color": "#776AC8"} ))
-    fig.add_trace(go.Histogram(x = metric_grp2, name = compare_grp2, marker = {"color": "#E8A134"}))
-    
-    #overlay the two histograms
-    fig.update_layout(barmode = "overlay",
-                      margin = dict(l=10, r=5, b=10, t=10),
-                      width = 550,
-                      height = 325,
-                      hoverlabel = {"font": dict(size=8)},
-                      paper_bgcolor = dark_color,
-                      plot_bgcolor = dark_color,
-                      xaxis = {"linecolor": danger_color},
-                      yaxis = {"title": "# of Providers", "gridcolor": danger_color},
-                      font = {"size": 8},
-                      font_color = light_color)
-    #reduce the opacity of each histogram
-    fig.update_traces(opacity = 0.75,
-                      showlegend = False,
-                      hovertemplate = "<b>Metric Value:</b> %{x}<br>" +
-                                      "<b># of Providers:</b> %{y}")
+    #look up the precomputed histogram counts and percentiles of the respective comparison group
+    counts_grp1, pvals_grp1 = get_hh_hist(metric_type, compare_type, compare_grp1)
+    counts_grp2, pvals_grp2 = get_hh_hist(metric_type, compare_type, compare_grp2)
+    end_callback_stage("aggregate")
+    
+    #both groups share the bin edges of the metric. only bins with providers are sent to the browser
+    edges = hh_hist_edges[metric_type]
+    bin_centers = np.round((edges[:-1] + edges[1:])/2, 6)
+    bin_width = edges[1] - edges[0]
+    
+    #define the bars of the two overlaid histograms (the layout is in the hh_histplot figure template)
+    fig = {"template": "hh_histplot",
+           "data": [{"type": "bar", "x": bin_centers[counts_grp1 > 0], "y": counts_grp1[counts_grp1 > 0], "width": bin_width, "name": compare_grp1},
+                    {"type": "bar", "x": bin_centers[counts_grp2 > 0], "y": counts_grp2[counts_grp2 > 0], "width": bin_width, "name": compare_grp2}]}
     
     #define the table header
-    table_header = [html.Thead(html.Tr([html.Th("MIN"), html.Th("25th"), html.Th("50th"), html.Th("75th"), html.Th("MAX")]))]
+    table_header = [hh_hist_table_header]
     #define the percentile values to be shown in table 1
-    table1_row = html.Tr([html.Td(pval) for pval in metric_grp1.quantile([0, 0.25, 0.5, 0.75, 1])])
+    table1_row = html.Tr([html.Td(pval) for pval in pvals_grp1])
     table1_body = [html.Tbody([table1_row])]
     table1 = dbc.Table(table_header + table1_body, bordered = True, size = "sm")
     #define the percentile values to be shown in table 2
-    table2_row = html.Tr([html.Td(pval) for pval in metric_grp2.quantile([0, 0.25, 0.5, 0.75, 1])])
+    table2_row = html.Tr([html.Td(pval) for pval in pvals_grp2])
     table2_body = [html.Tbody([table2_row])]
     table2 = dbc.Table(table_header + table2_body, bordered = True, size = "sm")
     
     desc1 = dcc.Markdown("""**""" + str(compare_grp1) + """:**""")
     desc2 = dcc.Markdown("""**""" + str(compare_grp2) + """:**""")
+    end_callback_stage("figure")
     
     return fig, desc1, desc2, table1, table2
     
@@ -981,47 +2882,31 @@ def render_hh_histplot(metric_type, compare_type, compare_grp1, compare_grp2):
 #callback to return a table showing the top and bottom 10 ranking hospice providers
 @app.callback([Output(component_id = "top10_rank_tble", component_property = "children"),
                Output(component_id = "last10_rank_tble", component_property = "children"),
-               Output(component_id = "hs_msr_comp_bar", component_property = "figure"),
-               Output(component_id = "hs_reg_comp_bar", component_property = "figure")],
+               Output(component_id = "hs_msr_comp_bar_update", component_property = "data"),
+               Output(component_id = "hs_reg_comp_bar_update", component_property = "data")],
               [Input(component_id = "hs_states_dp", component_property = "value"), 
                Input(component_id = "hs_measures_dp", component_property = "value"), 
                Input(component_id = "hs_yr_sl", component_property = "value"),
                Input(component_id = "hs_reg_rd", component_property = "value"),
                Input(component_id = "hs_comp_rd", component_property = "value")])
+@cache_callback
 def create_rank_table(state, measure, year_range, rank5_opt, avg_type):
     
-    #national hospice dataset containig providers from across all US states
-    national_hs_df = hs_df[(hs_df["Measure Name"] == measure) & 
-                           (hs_df["Start Date"].dt.year.between(year_range[0], year_range[1]))]
-    
-    if (state == "All"):
-        #filter the hospice dataset based on the selected parameters
-        filtered_hs_df = hs_df[(hs_df["Measure Name"] == measure) & 
-                               (hs_df["Start Date"].dt.year.between(year_range[0], year_range[1]))]
-        
+    #filter the hospice dataset based on the selected parameters and obtain the top and bottom 10 rows by score (ties are ranked by CCN).
+    #the bottom 10 rows are listed from highest to lowest score
+    if query_con is None:
+        top10_rank, last10_rank = get_hs_ranks(state, measure, year_range, 10)
     else:
-        #filter the hospice dataset based on the selected parameters
-        filtered_hs_df = hs_df[(hs_df["State"] == state) & 
-                               (hs_df["Measure Name"] == measure) & 
-                               (hs_df["Start Date"].dt.year.between(year_range[0], year_range[1]))]
-        
+        top10_rank, last10_rank = query_hs_ranks(state, measure, year_range, 10)
+    #show scores at display precision rather than as float32 values (e.g. 85.3 instead of 85.30000305)
+    top10_rank = top10_rank.assign(Score = top10_rank["Score"].astype("float64").round(2))
+    last10_rank = last10_rank.assign(Score = last10_rank["Score"].astype("float64").round(2))
+    end_callback_stage("rank")
     
-    #remove records where score is not available from consideration
-    filtered_hs_df = filtered_hs_df[filtered_hs_df["Score"] != "Not Available"] 
-    national_hs_df = national_hs_df[national_hs_df["Score"] != "Not Available"]
-    #convert to numeric data type
-    filtered_hs_df["Score"] = pd.to_numeric(filtered_hs_df["Score"])
-    national_hs_df["Score"] = pd.to_numeric(national_hs_df["Score"])
-    
-    #calculate the median/mean score for the filtered dataset
-    filtered_df_median = filtered_hs_df.groupby(filtered_hs_df["Start Date"].dt.year).aggregate({"Score": avg_type.lower()}).reset_index()
-    national_df_median = national_hs_df.groupby(national_hs_df["Start Date"].dt.year).aggregate({"Score": avg_type.lower()}).reset_index()
-    
-    #sort by score and obtain the top and bottom 10 rows
-    filtered_hs_df = filtered_hs_df.sort_values(by = "Score", ascending = False)
-    filtered_hs_df = filtered_hs_df.rename(columns = {"CMS Certification Number (CCN)": "CCN"})
-    top10_rank = filtered_hs_df.head(10)[["CCN", "Facility Name", "Score"]]
-    last10_rank = filtered_hs_df.tail(10)[["CCN", "Facility Name", "Score"]]
+    #look up the median/mean score for the selected state and for the nation
+    filtered_df_median = get_hs_stats("National" if state == "All" else state, measure, year_range, avg_type)
+    national_df_median = get_hs_stats("National", measure, year_range, avg_type)
+    end_callback_stage("aggregate")
     
     #--------------------------------------------------------------------------
     
@@ -1038,67 +2923,31 @@ def create_rank_table(state, measure, year_range, rank5_opt, avg_type):
     
     #--------------------------------------------------------------------------
     
-    #define the data for the bar charts
-    filtered_df_msr_bar = go.Bar(x = filtered_df_median["Start Date"],
-                                 y = filtered_df_median["Score"],
-                                 marker = {"color": "#776AC8"},
-                                 name = state,
-                                 width = [0.3 for i in filtered_df_median["Start Date"]])
-    national_df_msr_bar = go.Bar(x = national_df_median["Start Date"],
-                                 y = national_df_median["Score"],
-                                 marker = {"color": "#E8A134"},
-                                 name = "National",
-                                 width = [0.3 for i in national_df_median["Start Date"]])
-    
-    #define the layout for the bar graphs
-    msr_layout = go.Layout(paper_bgcolor = dark_color,
-                           plot_bgcolor = dark_color,
-                           font_color = light_color,
-                           bargroupgap = 0.1,
-                           bargap = 0.3,
-                           legend = dict(orientation = "h", yanchor = "middle", xanchor = "center", y = -0.15, x = 0.5),
-                           font = {"size": 8},
-                           title = {"text": "<b>COMPARISON OF STATE AND NATIONAL " + avg_type.upper() + " MEASURE SCORE:</b>",
-                                    "font": {"color": danger_color, "size": 12}},
-                           xaxis = {"linecolor": danger_color},
-                           yaxis = {"title": avg_type + " Score", "gridcolor": danger_color})
-        
-    msr_data = [filtered_df_msr_bar, national_df_msr_bar]
-    
-    msr_figure = go.Figure(data = msr_data, layout = msr_layout)
-    msr_figure.update_traces(hovertemplate = "<b>" + avg_type + ":</b> %{y}<extra></extra>")
+    #define the data for the bar charts and the layout properties that depend on the average type (the rest is in the hs_msr_comp_bar figure template)
+    msr_hovertemplate = "<b>" + avg_type + ":</b> %{y}<extra></extra>"
+    msr_figure = {"template": "hs_msr_comp_bar",
+                  "data": [{"type": "bar", "x": filtered_df_median["Start Year"], "y": filtered_df_median["Score"].astype("float64").round(2),
+                            "name": state, "hovertemplate": msr_hovertemplate},
+                           {"type": "bar", "x": national_df_median["Start Year"], "y": national_df_median["Score"].astype("float64").round(2),
+                            "name": "National", "hovertemplate": msr_hovertemplate}],
+                  "layout": {"title": {"text": "<b>COMPARISON OF STATE AND NATIONAL " + avg_type.upper() + " MEASURE SCORE:</b>"},
+                             "yaxis": {"title": {"text": avg_type + " Score"}}}}
+    end_callback_stage("figure")
     
     #--------------------------------------------------------------------------
     
-    #calculate the median score by county
-    filtered_df_reg = filtered_hs_df.groupby("County Name").aggregate({"CCN": "nunique", "Score": "median"}).reset_index()
-    filtered_df_reg = filtered_df_reg.sort_values(by = "Score", ascending = False if rank5_opt == "Top 5" else True)
-    #filter to the top or bottom 5 county
-    rank5_reg = filtered_df_reg.head(5)
-    
-    #define the data format for the county comparison bar graph
-    filtered_df_reg_bar = go.Bar(x = rank5_reg["County Name"],
-                                 y = rank5_reg["Score"], 
-                                 marker = {"color": "#3E84DF"})
-    reg_data = [filtered_df_reg_bar]
-    
-    #define the layout for the county comparison bar graph
-    reg_layout = go.Layout(paper_bgcolor = dark_color,
-                           plot_bgcolor = dark_color,
-                           font_color = light_color,
-                           bargroupgap = 0.1,
-                           bargap = 0.3,
-                           font = {"size": 8},
-                           title = {"text": "<b>COMPARISON OF MEASURE SCORE FOR TOP/BOTTOM 5 COUNTIES:</b>", 
-                                    "font":{"color": danger_color, "size": 12}},
-                           xaxis = {"linecolor": danger_color},
-                           yaxis = {"title": "Median Score", "gridcolor": danger_color})
-    
-    reg_figure = go.Figure(data = reg_data, layout = reg_layout)
-    reg_figure.update_traces(showlegend = False,
-                             customdata = rank5_reg["CCN"],
-                             hovertemplate = "<b># of CCNs:</b> %{customdata}<br>" +
-                                             "<b>Median:</b> %{y}<extra></extra>")
+    #look up the median score by county
+    filtered_df_reg = get_hs_county_stats("National" if state == "All" else state, measure, year_range)
+    end_callback_stage("aggregate")
+    #filter to the top or bottom 5 county (ties are ranked by county name)
+    rank5_reg = filtered_df_reg.iloc[select_top_k(filtered_df_reg["Score"], 5, ascending = rank5_opt != "Top 5", tie_keys = filtered_df_reg["County Name"])]
+    rank5_reg = rank5_reg.assign(Score = rank5_reg["Score"].astype("float64").round(2))
+    end_callback_stage("rank")
+    
+    #define the data for the county comparison bar graph (the layout is in the hs_reg_comp_bar figure template)
+    reg_figure = {"template": "hs_reg_comp_bar",
+                  "data": [{"type": "bar", "x": rank5_reg["County Name"], "y": rank5_reg["Score"], "customdata": rank5_reg["CCN"]}]}
+    end_callback_stage("figure")
     
     return top10_table, last10_table, msr_figure, reg_figure
 
@@ -1108,105 +2957,76 @@ def create_rank_table(state, measure, year_range, rank5_opt, avg_type):
 #------------------------------------------------------------------------------
 
 #create cost and value hospital pie charts
-@app.callback([Output(component_id = "ho_value_pie", component_property = "figure"),
-              Output(component_id = "ho_cost_pie", component_property = "figure"),
+@app.callback([Output(component_id = "ho_value_pie_update", component_property = "data"),
+              Output(component_id = "ho_cost_pie_update", component_property = "data"),
               Output(component_id = "ho_value_tble", component_property = "children"),
               Output(component_id = "ho_cost_tble", component_property = "children")],
               [Input(component_id = "ho_state_dp", component_property = "value"),
                Input(component_id = "ho_msr_dp", component_property = "value"),
                Input(component_id = "ho_val_sl", component_property = "value"),
                Input(component_id = "ho_pmt_sl", component_property = "value")])
+@cache_callback
 def create_hospital_pies(state, measure, value_cat, pmt_cat):
     
-    measure = measure.replace("Measure", "").strip().lower()
+    #look up the precomputed hospital counts and payments for the appropriate state and measure of interest, by state (All states) or by city
+    geo_col = "State" if state == "All" else "City"
+    view_df = get_ho_view(measure, state).rename(columns = {"Geo": geo_col})
+    end_callback_stage("filter")
     
-    #filter data to the appropriate state and measure of interest
-    if state == "All":
-        filtered_ho_df = ho_df[ho_df["Payment Measure Name"].str.contains(measure)]
-    else:
-        filtered_ho_df = ho_df[(ho_df["State"] == state) &
-                               (ho_df["Payment Measure Name"].str.contains(measure))]
-    
-    #count the number of providers in each payment/value category
-    nprov_by_pmt = filtered_ho_df.groupby("Payment Category").aggregate({"Facility ID": "nunique"}).reset_index()
-    nprov_by_val = filtered_ho_df.groupby("Value of Care Category").aggregate({"Facility ID": "nunique"}).reset_index()
-
-    #pie chart for value
-    val_data = go.Pie(labels = nprov_by_val["Value of Care Category"],
-                      values = nprov_by_val["Facility ID"],
-                      hole = 0.5,
-                      marker = dict(colors = px.colors.sequential.Blues))
-    val_layout = go.Layout(title = {"text": "<b>% OF HOSPITALS BY VALUE CARE CATEGORY:</b>", "font": {"size": 12, "color": danger_color}},
-                           legend = dict(orientation = "h", yanchor = "middle", xanchor = "center", y = -0.7, x = 0.5),
-                           font = {"size": 8, "color": "white"},
-                           paper_bgcolor = dark_color,
-                           plot_bgcolor = dark_color,
-                           margin = dict(l=0))
-    val_fig = go.Figure(data = val_data, layout = val_layout)
-    val_fig.update_traces(hoverlabel = {"font": {"size": 10}},
-                          hovertemplate = "%{label}:<br>" +
-                                          "# of Hospitals: %{value:,}<br>" +
-                                          "% of Hospitals: %{percent}" +
-                                          "<extra></extra>")
-
-    #pie chart for payment
-    pmt_data = go.Pie(labels = nprov_by_pmt["Payment Category"],
-                      values = nprov_by_pmt["Facility ID"],
-                      hole = 0.5,
-                      marker = dict(colors = px.colors.sequential.Oryel))
-    pmt_layout = go.Layout(title = {"text": "<b>% OF HOSPITALS BY PAYMENT CATEGORY:</b>", "font": {"size": 12, "color": danger_color}},
-                           legend = dict(orientation = "h", yanchor = "middle", xanchor = "center", y = -0.7, x = 0.5),
-                           font = {"size": 8, "color": "white"},
-                           paper_bgcolor = dark_color,
-                           plot_bgcolor = dark_color,
-                           margin = dict(l=0))
-    pmt_fig = go.Figure(data = pmt_data, layout = pmt_layout)
-    pmt_fig.update_traces(hoverlabel = {"font": {"size": 10}},
-                          hovertemplate = "%{label}:<br>" + 
-                                          "# of Hospitals: %{value:,}<br>" +
-                                          "% of Hospitals: %{percent}" + 
-                                          "<extra></extra>")
+    #count the number of providers in each payment/value category. the text columns of the view are categorical when it is shared (see map_shared_frame),
+    #so only the categories found in it are kept, and the groups are sorted by name as pandas leaves observed categories in order of appearance
+    nprov_by_pmt = view_df.groupby("Payment Category", observed = True).aggregate({"Facilities": "sum"}).sort_index().reset_index()
+    nprov_by_val = view_df.groupby("Value of Care Category", observed = True).aggregate({"Facilities": "sum"}).sort_index().reset_index()
+    end_callback_stage("aggregate")
+
+    #pie chart for value (the layout is in the ho_value_pie figure template)
+    val_fig = {"template": "ho_value_pie",
+               "data": [{"type": "pie", "labels": nprov_by_val["Value of Care Category"], "values": nprov_by_val["Facilities"]}]}
+
+    #pie chart for payment (the layout is in the ho_cost_pie figure template)
+    pmt_fig = {"template": "ho_cost_pie",
+               "data": [{"type": "pie", "labels": nprov_by_pmt["Payment Category"], "values": nprov_by_pmt["Facilities"]}]}
+    end_callback_stage("figure")
     
     #--------------------------------------------------------------------------
     
-    #count the number of providers by value care category and state/city
-    nprov_by_val_st = filtered_ho_df.groupby(["Value of Care Category", "State" if state == "All" else "City"]).aggregate({"Facility ID": "nunique"}).reset_index()
+    #count the number of providers by state/city for the selected value care category
+    df = view_df[view_df["Value of Care Category"] == value_cat].groupby(geo_col, observed = True).aggregate({"Facilities": "sum"}).sort_index().reset_index()
+    end_callback_stage("aggregate")
     
-    #sort the number of hospitals from highest to lowest for each value care category
-    df = nprov_by_val_st[nprov_by_val_st["Value of Care Category"] == value_cat].sort_values(by = "Facility ID", ascending = False)
-    #get the top 5 states with the highest number of hospitals
-    df = df.head(5)
-    df = df.rename(columns = {"Facility ID": "# of Hospitals"})
+    #get the top 5 states with the highest number of hospitals (ties are ranked by state/city name)
+    df = df.iloc[select_top_k(df["Facilities"], 5, tie_keys = df[geo_col])]
+    df = df.rename(columns = {"Facilities": "# of Hospitals"})
+    end_callback_stage("rank")
    
     #create data table
-    val_table = dbc.Table.from_dataframe(df[["State" if state == "All" else "City", "# of Hospitals"]], 
+    val_table = dbc.Table.from_dataframe(df[[geo_col, "# of Hospitals"]], 
                                         striped = True,
                                         bordered = True,
                                         hover = False,
                                         style = {"font-size": "10px"})
-    
+    end_callback_stage("figure")
     
     #--------------------------------------------------------------------------
 
-    #remove records where payment is not available
-    costdf = filtered_ho_df[filtered_ho_df["Payment"] != "Not Available"]
-    #convert text dollar string into integer amount
-    costdf["Payment"] = costdf["Payment"].str.replace("$", "").str.replace(",", "").astype(int)
-    #calculate the average payment amount by state
-    costdf_by_pmt_st = costdf.groupby(["Payment Category", "State" if state == "All" else "City"]).aggregate({"Payment": "mean"}).reset_index()
-    
-    #sort states from highest to lowest based on average cost
-    df = costdf_by_pmt_st[costdf_by_pmt_st["Payment Category"] == pmt_cat].sort_values(by = "Payment", ascending = False)
-    #get the top 5 states with the highest cost
-    df = df.head(5)
+    #calculate the average payment amount by state/city for the selected payment category, leaving out payments that are not available
+    df = view_df[view_df["Payment Category"] == pmt_cat].groupby(geo_col, observed = True).aggregate({"Payment Sum": "sum", "Payment Count": "sum"}).sort_index().reset_index()
+    df = df[df["Payment Count"] > 0]
+    df = df.assign(Payment = df["Payment Sum"]/df["Payment Count"])
+    end_callback_stage("aggregate")
+    
+    #get the top 5 states with the highest average cost (ties are ranked by state/city name)
+    df = df.iloc[select_top_k(df["Payment"], 5, tie_keys = df[geo_col])]
+    end_callback_stage("rank")
     df = df.rename(columns = {"Payment": "Avg Hospital Payment"})
     df["Avg Hospital Payment"] = df["Avg Hospital Payment"].apply(lambda x: "$ {0:,}".format(round(x,2)))
     #create data table
-    cost_table = dbc.Table.from_dataframe(df[["State" if state == "All" else "City", "Avg Hospital Payment"]],
+    cost_table = dbc.Table.from_dataframe(df[[geo_col, "Avg Hospital Payment"]],
                                           striped = True,
                                           bordered = True,
                                           hover = False,
                                           style = {"font-size": "10px"})
+    end_callback_stage("figure")
  
     return val_fig, pmt_fig, val_table, cost_table
 
@@ -1216,10 +3036,9 @@ def create_hospital_pies(state, measure, value_cat, pmt_cat):
               [Input(component_id = "news_outlet_sl", component_property = "value")])
 def get_top5_news_by_cat(news_outlet):
     
-    #pull all health related articles
-    news_request = requests.get("https://newsapi.org/v2/top-headlines?country=us&category=health" + "&apiKey=" + apikey)
-    news_data = pd.DataFrame(news_request.json()["articles"])
-    news_data = news_data[["source", "title", "author", "publishedAt", "url"]]
+    #pull all health related articles (shared by every news outlet)
+    news_json = get_news_json("top-headlines", {"country": "us", "category": "health"})
+    news_data = pd.DataFrame(news_json["articles"], columns = ["source", "title", "author", "publishedAt", "url"])
     news_data["id"] = news_data["source"].str.get("id")
     news_data["name"] = news_data["source"].str.get("name")
         
@@ -1271,9 +3090,8 @@ def get_top5_news_by_inp(news_topic):
     else:
     
         #pull all article that references the specified input topic
-        news_request = requests.get("https://newsapi.org/v2/everything?q=" + news_topic + "&apiKey=" + apikey)
-        news_data = pd.DataFrame(news_request.json()["articles"])
-        news_data = news_data[["title", "author", "publishedAt", "url"]]
+        news_json = get_news_json("everything", {"q": news_topic})
+        news_data = pd.DataFrame(news_json["articles"], columns = ["title", "author", "publishedAt", "url"])
         
         #sort data from most recent to latest
         news_data["publishedAt"] = pd.to_datetime(news_data["publishedAt"])
@@ -1302,5 +3120,53 @@ def get_top5_news_by_inp(news_topic):
     return [table_title, html.Br(), top5_table]
  
 
+end_startup_phase("callbacks")
+
+#------------------------------------------------------------------------------
+#APPLICATION STARTUP
+#------------------------------------------------------------------------------
+
+#seconds the dashboard may take to start (load the data and define the dashboard) before report_startup_timings flags it
+startup_budget = float(os.environ.get("MEDICARE_STARTUP_BUDGET", 20))
+
+#function to print the seconds spent in each startup phase. returns whether the startup took less than the budget
+def report_startup_timings():
+    
+    total_secs = sum(startup_timings.values())
+    for phase, secs in startup_timings.items():
+        print("{0:<40}{1:>8.2f}s".format(phase, secs))
+    print("{0:<40}{1:>8.2f}s (budget {2:.2f}s)".format("total", total_secs, startup_budget))
+    if total_secs > startup_budget:
+        print("Startup took longer than the budget of {0:.2f}s set by MEDICARE_STARTUP_BUDGET".format(startup_budget))
+    
+    return total_secs <= startup_budget
+
+#function to return the dash application, e.g. for a WSGI server (gunicorn "medicare_dashboard:create_app().server").
+#the news outlets are requested in the background and each content page is built on first navigation, so nothing waits on the network.
+#the data watcher (see start_data_watcher) is started by the first request handled by each process
+def create_app():
+    
+    get_news_outlets()
+    report_startup_timings()
+    
+    return app
+
+
 if __name__ == "__main__":
-    app.run_server(debug = False)
+    
+    parser = argparse.ArgumentParser(description = "Medicare Utilization Dashboard")
+    parser.add_argument("--build-cache", action = "store_true", help = "re-read the source csv files and rebuild the cached parquet copies")
+    parser.add_argument("--precompute", action = "store_true", help = "compute and save the callback results for every combination of input values")
+    parser.add_argument("--callbacks", nargs = "+", help = "names of the callbacks to precompute (all cached callbacks by default)")
+    parser.add_argument("--workers", type = int, help = "number of worker processes used to precompute results (number of CPUs by default)")
+    parser.add_argument("--startup-timings", action = "store_true", help = "print the time spent in each startup phase and exit with an error if it is over the budget")
+    args = parser.parse_args()
+    
+    if args.build_cache:
+        build_input_cache()
+    elif args.precompute:
+        precompute_all_results(args.callbacks, args.workers)
+    elif args.startup_timings:
+        sys.exit(0 if report_startup_timings() else 1)
+    else:
+        create_app().run_server(debug = False)